@@ -1,56 +1,196 @@
 # -*- coding: utf-8 -*-
 import logging
-import inspect
+import threading
 import traceback
 import time
-import threading
 import sys
 import paramiko
+from ConfigReloader import ConfigReloader
+from Configuration import load_configuration, check_topics, SCENES, CONFIG_DIRECTORY
+from LogPipeline import LogPipeline
 from MQTTConenectionManager import MQTTConnectionManager
-import xml.etree.ElementTree as ET
+from MemoryWriter import MemoryWriter
+from Navigation import RouteRunner
+from SSHSessionPool import SSHSessionPool
+from SpeechPipeline import SpeechPipeline, validate_markup
+from StateCache import StateCache
+from Startup import StartupOrchestrator
+from Timeline import Timeline
+from Tracing import Tracer
+from TopicIndex import HANDLER_WINDOW, HANDLER_MEMORY
 
 class BasicBehaviour:
-    def __init__(self, application, session):
+    # Attributname und NAOqi-Service der benötigten Proxies
+    SERVICES = (
+        ("memory", "ALMemory"),
+        ("motion", "ALMotion"),
+        ("text_to_speech", "ALTextToSpeech"),
+        ("animated_speech", "ALAnimatedSpeech"),
+        ("animation_player", "ALAnimationPlayer"),
+        ("behavior_manager", "ALBehaviorManager")
+    )
+
+    # Methoden der Services, die beim Tracing als Span erfasst werden
+    TRACED_METHODS = {
+        "ALMotion": ("moveTo", "angleInterpolationWithSpeed", "wakeUp", "rest"),
+        "ALAnimationPlayer": ("run",),
+        "ALBehaviorManager": ("runBehavior",)
+    }
+
+    # Behaviors, die von den Szenen über runBehavior gestartet werden
+    SCENE_BEHAVIORS = {
+        "MUSIC": ("Headbang",),
+        "ROLLER_SHUTTER": ("WTF",)
+    }
+
+    # Items und Gerätegruppen, die die Szenen schalten oder deren Zustand sie abwarten; daraus werden die
+    # Abonnements je Szene abgeleitet
+    SCENE_TOPICS = {
+        "MUSIC": ("Multimedia/speakers/SONOS_SPEAKER_URI", "Multimedia/speakers/SONOS_SPEAKER_MUTE"),
+        "ALEXA": ("Conference/projector/PROJECTOR",),
+        "ROLLER_SHUTTER": ("Conference/roller_shutters/ROLLER_SHUTTER_2",),
+        "CAR_DRIVING_TRAINING": ("Conference/projector/PROJECTOR",),
+        "KITCHEN": ("Conference/roller_shutters/ROLLER_SHUTTER_2", "Kitchen/lights/HUE_SWITCH", "Kitchen/lights/HUE_4_SWITCH"),
+        "FAREWELL": ("Kitchen/lights/HUE_SWITCH", "Kitchen/lights/HUE_4_SWITCH")
+    }
+    SCENE_GROUPS = {
+        "MUSIC": ("MUSIC_START",),
+        "KITCHEN": ("KITCHEN_LIGHTS",),
+        "FAREWELL": ("KITCHEN_LIGHTS",)
+    }
+    REQUIRED_TOPICS = tuple(sorted(set(path for paths in SCENE_TOPICS.values() for path in paths)))
+    REQUIRED_GROUPS = tuple(sorted(set(name for names in SCENE_GROUPS.values() for name in names)))
+
+    def __init__(self, application, session, configuration=None, name=None, state_cache=None,
+                 mqtt_connection_manager=None, ssh_pool=None, tracer=None, reloader=None):
         self.application = application
-
-        app_file_path = "config/app.xml"
-        config_file_path = "config/config.xml"
-        mqtt_topics_file_path = "config/mqtt_topics.xml"
-        text_file_path = "config/text.xml"
-
-        app_root = ET.parse(app_file_path).getroot()
-        config_root = ET.parse(config_file_path).getroot()
-        mqtt_topics_root = ET.parse(mqtt_topics_file_path).getroot()
-        text_root = ET.parse(text_file_path).getroot()
-
-        self.app_config_xml = app_root.find('config')
-        self.app_functions_xml = app_root.find('functions')
-        self.config_xml = config_root
-        self.text_xml = text_root
-        self.mqtt_topics_xml = mqtt_topics_root
-
-        self.memory = session.service("ALMemory")
-        self.motion = session.service("ALMotion")
-        self.text_to_speech = session.service("ALTextToSpeech")
-        self.animated_speech = session.service("ALAnimatedSpeech")
-        self.animation_player = session.service("ALAnimationPlayer")
-        self.behavior_manager = session.service("ALBehaviorManager")
+        self.name = name
+
+        # Unter dem Supervisor teilen sich mehrere Roboter Broker-Verbindung, SSH-Pool, StateCache und Tracer
+        self.supervised = mqtt_connection_manager is not None
+        self.mqtt_connection_manager = mqtt_connection_manager
+        self.finished = False
+
+        # Gemeinsam genutzter Konfigurations-Schnappschuss; nur laden, falls keiner übergeben wurde
+        if configuration is None:
+            configuration = load_configuration()
+        self.configuration = configuration
+        self.topics = configuration.topics
+        self.subscriptions = self.scene_subscriptions(configuration.topics)
+
+        # Topic-Index einmalig kompilieren, damit on_subscription ohne XML-Zugriffe auskommt
+        self.topic_index = configuration.topics.index
+        self.subscription_handlers = {
+            HANDLER_WINDOW: self.on_window_state,
+            HANDLER_MEMORY: self.on_memory_state
+        }
 
         self.session = session
+        self.startup_started = time.time()
 
-        self.mqtt_connection_manager = MQTTConnectionManager(self)
-        self.logger = None
+        system = configuration.system
 
-        if self.__stringToBoolean(self.config_xml.find("DEBUG").text):
+        self.logger = None
+        if system.debug:
             self.init_logger()
 
-        self.config()
-
-    def __stringToBoolean(self, string):
-        if string.lower() == "true":
-            return True
+        # text.xml und app.xml im Hintergrund überwachen; übernommen wird zwischen den Szenen
+        self.reloader = reloader
+        self.owns_reloader = reloader is None and system.config_reload
+        if self.owns_reloader:
+            self.reloader = ConfigReloader(configuration, CONFIG_DIRECTORY, system.config_reload_interval,
+                                           lambda message: self.log(logging.WARNING, message))
+        self.installed_animations = None
+
+        self.tracer = tracer
+        if tracer is None:
+            self.tracer = Tracer(system.trace_enabled,
+                                 system.trace_capacity,
+                                 system.trace_ring_file,
+                                 system.trace_ring_capacity,
+                                 system.trace_flush_interval)
+
+        # Letzte bekannte Gerätezustände, gespeist aus dem Subscription-Stream
+        self.state_cache = state_cache
+        if state_cache is None:
+            self.state_cache = StateCache(system.state_cache_ttl, configuration.topics.ttls)
+
+        # SSH-Verbindung zum Raspberry Pi schon beim Start aufbauen und halten
+        if ssh_pool is not None:
+            self.ssh_pool = ssh_pool
+        elif system.simulation:
+            from Simulation import SimulatedSSHSessionPool
+            self.ssh_pool = SimulatedSSHSessionPool(system.simulation_ssh_latency)
         else:
-            return False
+            self.ssh_pool = SSHSessionPool(system.ssh_host,
+                                           system.ssh_port,
+                                           system.ssh_user,
+                                           system.ssh_password,
+                                           system.ssh_keepalive_interval,
+                                           system.ssh_reconnect_delay,
+                                           system.ssh_check_interval,
+                                           system.ssh_connect_timeout)
+
+        # SSH nur für die Fahrschul-Szene und ohne auf den Verbindungsaufbau zu warten
+        if "CAR_DRIVING_TRAINING" in configuration.app.enabled_functions:
+            self.warm_up_ssh()
+
+        # Service-Proxies, Broker, Vorladen der Behaviors und wakeUp laufen parallel
+        startup = StartupOrchestrator()
+        for attribute, service_name in self.SERVICES:
+            startup.phase(service_name, lambda attribute=attribute, service_name=service_name: self.acquire_service(attribute, service_name))
+        startup.phase("mqtt", self.connect_mqtt, depends_on=("ALMemory",))
+        startup.phase("preload_behaviors", self.preload_behaviors, depends_on=("ALBehaviorManager",))
+        startup.phase("validate_texts", self.validate_texts, depends_on=("ALBehaviorManager",))
+        startup.phase("wake_up", self.config, depends_on=("ALMotion", "ALTextToSpeech"))
+        startup.run()
+
+        for line in startup.report():
+            print("Startup:", line)
+            self.log(logging.INFO, "Startup: " + line)
+
+        # Zeilen werden als Kette von qi-Futures gesprochen
+        self.speech = SpeechPipeline(self.animated_speech)
+        self.routes = RouteRunner(self.motion)
+
+    def acquire_service(self, attribute, service_name):
+        service = self.session.service(service_name)
+        setattr(self, attribute, self.tracer.wrap(service, service_name, self.TRACED_METHODS.get(service_name, ())))
+
+    def warm_up_ssh(self):
+        thread = threading.Thread(target=self.ssh_pool.warm_up, name="SSHWarmUp")
+        thread.daemon = True
+        thread.start()
+
+    def connect_mqtt(self):
+        system = self.configuration.system
+
+        # Zustandsupdates gesammelt nach ALMemory schreiben, bevor die ersten Nachrichten eintreffen
+        self.memory_writer = MemoryWriter(self.memory,
+                                          system.memory_writer_flush_interval,
+                                          system.memory_writer_max_batch,
+                                          system.memory_writer_sync,
+                                          lambda message: self.log(logging.ERROR, message))
+
+        if not self.supervised:
+            self.mqtt_connection_manager = MQTTConnectionManager(self, self.configuration, self.state_cache, self.tracer, self.subscriptions)
+
+    @classmethod
+    def scene_subscriptions(cls, topics):
+        """
+        Prüft die mqtt_topics.xml gegen SCENE_TOPICS und SCENE_GROUPS und liefert die Abonnements je Szene.
+        """
+        check_topics(topics, cls.REQUIRED_TOPICS, cls.REQUIRED_GROUPS)
+        return topics.scene_subscriptions(cls.SCENE_TOPICS, cls.SCENE_GROUPS)
+
+    def preload_behaviors(self, scenes=None):
+        for function_name in self.configuration.app.enabled_functions if scenes is None else scenes:
+            for behavior in self.SCENE_BEHAVIORS.get(function_name, ()):
+                try:
+                    if not self.behavior_manager.preloadBehavior(behavior):
+                        self.log(logging.WARNING, "Behavior could not be preloaded: " + behavior)
+                except Exception as ex:
+                    self.log(logging.ERROR, traceback.format_exc())
 
     def start(self):
         try:
@@ -58,8 +198,20 @@ class BasicBehaviour:
         except Exception as ex:
             self.log(logging.ERROR, traceback.format_exc())
 
+    def validate_texts(self):
+        """
+        Prüft die Annotationen aus text.xml und meldet Probleme als Warnung, u.a. nicht installierte Animationen.
+        """
+        try:
+            self.installed_animations = set(self.behavior_manager.getInstalledBehaviors())
+            for problem in validate_markup(self.configuration.texts, self.installed_animations):
+                print("text.xml:", problem)
+                self.log(logging.WARNING, "text.xml: " + problem)
+        except Exception as ex:
+            self.log(logging.ERROR, traceback.format_exc())
+
     def config(self):
-        self.text_to_speech.setLanguage(self.app_config_xml.find("LANGUAGE").text)
+        self.text_to_speech.setLanguage(self.configuration.app.language)
         self.motion.setExternalCollisionProtectionEnabled("All", True)
         self.motion.setWalkArmsEnabled(True, True)
         self.motion.setOrthogonalSecurityDistance(0.15)
@@ -67,41 +219,67 @@ class BasicBehaviour:
 
     def presentation(self):
         print("Presentation")
+        self.log(logging.INFO, "Presentation starts {:.3f}s after launch".format(time.time() - self.startup_started))
         self.put_head_up()
 
-        # Liste der Funktionen, wie sie in der XML-Datei stehen
-        function_list = [
-            ("WELCOME", self.welcome),
-            ("MUSIC", self.music),
-            ("ALEXA", self.alexa),
-            ("ROLLER_SHUTTER", self.roller_shutter),
-            ("CAR_DRIVING_TRAINING", self.car_driving_training),
-            ("KITCHEN", self.kitchen),
-            ("FAREWELL", self.farewell)
-        ]
-
-        for function_name, function_method in function_list:
-            if self.__stringToBoolean(self.app_functions_xml.find(function_name).text):
-                function_method()
-                if self.is_last_function(function_list, function_name):
-                    print("{} is the last function which will be executed.".format(function_name))
-
-                    farewell_status = self.__stringToBoolean(self.app_functions_xml.find("FAREWELL").text)
-                    if not farewell_status:
-                        self.finalize_presentation()
+        # Zuordnung der Szenen aus der app.xml zu ihren Methoden
+        function_methods = {
+            "WELCOME": self.welcome,
+            "MUSIC": self.music,
+            "ALEXA": self.alexa,
+            "ROLLER_SHUTTER": self.roller_shutter,
+            "CAR_DRIVING_TRAINING": self.car_driving_training,
+            "KITCHEN": self.kitchen,
+            "FAREWELL": self.farewell
+        }
+
+        # Die aktiven Szenen werden vor jeder Szene neu gelesen, damit Änderungen an der app.xml greifen
+        position = -1
+        while True:
+            self.apply_configuration_update()
+            remaining = [name for name in self.configuration.app.enabled_functions if SCENES.index(name) > position]
+            if not remaining:
+                break
+            function_name = remaining[0]
+            position = SCENES.index(function_name)
+
+            with self.tracer.span(function_name, "scene"):
+                function_methods[function_name]()
+
+            self.apply_configuration_update()
+            if not [name for name in self.configuration.app.enabled_functions if SCENES.index(name) > position]:
+                print("{} is the last function which will be executed.".format(function_name))
+
+                if not self.configuration.app.functions["FAREWELL"]:
+                    self.finalize_presentation()
 
         self.disconnect_all()
 
-    def is_last_function(self, function_list, current_function_name):
+    def apply_configuration_update(self):
         """
-        Prüft, ob die aktuelle Funktion die letzte True-Funktion ist.
+        Übernimmt einen neu geladenen Konfigurations-Schnappschuss; wird nur zwischen den Szenen aufgerufen.
         """
-        for function_name, _ in function_list:
-            if function_name == current_function_name:
-                continue  # Überspringe die aktuelle Funktion
-            if self.__stringToBoolean(self.app_functions_xml.find(function_name).text):
-                return False  # Es gibt noch eine andere ausführbare Funktion
-        return True
+        if self.reloader is None or self.reloader.configuration is self.configuration:
+            return
+        previous = self.configuration
+        self.configuration = self.reloader.configuration
+        self.topics = self.configuration.topics
+
+        if self.configuration.app is not previous.app:
+            for scene, enabled in self.configuration.app.functions.items():
+                if enabled != previous.app.functions[scene]:
+                    self.mqtt_connection_manager.set_scene_enabled(scene, enabled)
+                    if enabled:
+                        self.preload_behaviors((scene,))
+                    if enabled and scene == "CAR_DRIVING_TRAINING":
+                        self.warm_up_ssh()
+
+        if self.configuration.texts is not previous.texts and self.installed_animations is not None:
+            for problem in validate_markup(self.configuration.texts, self.installed_animations):
+                self.log(logging.WARNING, "text.xml: " + problem)
+
+        file_name, parse_seconds = self.reloader.last_reload
+        self.log(logging.INFO, "Configuration reloaded ({} parsed in {:.1f}ms)".format(file_name, parse_seconds * 1000))
 
     def finalize_presentation(self):
         """
@@ -113,59 +291,52 @@ class BasicBehaviour:
 
     def welcome(self):
         print("Welcome")
-        welcome_text = self.text_xml.find("welcome")
 
         try:
-            self.say_lines([welcome_text.find("LINE_1").text, welcome_text.find("LINE_2").text, welcome_text.find("LINE_3").text, welcome_text.find("LINE_4").text, welcome_text.find("LINE_5").text])
+            self.say_lines([self.text("welcome", "LINE_1"), self.text("welcome", "LINE_2"), self.text("welcome", "LINE_3"), self.text("welcome", "LINE_4"), self.text("welcome", "LINE_5")])
             self.put_head_up()
         except Exception as ex:
             self.log(logging.ERROR, traceback.format_exc())
 
     def music(self):
         print("Music")
-        music_text = self.text_xml.find("music")
-
-        multimedia_elements = self.mqtt_topics_xml.find('Multimedia')
-        if multimedia_elements is not None:
-            speakers_elements = multimedia_elements.find("speakers")
 
         try:
-            self.say_lines([music_text.find("LINE_1").text, music_text.find("LINE_2").text])
+            self.say_lines([self.text("music", "LINE_1"), self.text("music", "LINE_2")])
             # Play music
-            self.mqtt_connection_manager.publish_to_item(speakers_elements.find("SONOS_SPEAKER_URI").text, self.config_xml.find("MUSIC_URL").text)
-            self.mqtt_connection_manager.publish_to_item(speakers_elements.find("SONOS_SPEAKER_MUTE").text, "OFF")
-            self.mqtt_connection_manager.publish_to_item(speakers_elements.find("SONOS_SPEAKER_VOLUME").text, "50")
+            music_url = self.configuration.system.music_url
+            started = time.time()
+            self.publish_group("MUSIC_START", music_url)
 
-            time.sleep(5)
+            self.wait_for_state(self.topics.item("Multimedia/speakers/SONOS_SPEAKER_URI"), lambda value: value == music_url, 5, since=started)
 
             self.behavior_manager.runBehavior("Headbang")
 
             time.sleep(2)
 
-            self.mqtt_connection_manager.publish_to_item(speakers_elements.find("SONOS_SPEAKER_MUTE").text, "ON")
+            self.mqtt_connection_manager.publish_to_item(self.topics.item("Multimedia/speakers/SONOS_SPEAKER_MUTE"), "ON")
 
-            time.sleep(2)
+            self.wait_for_state(self.topics.item("Multimedia/speakers/SONOS_SPEAKER_MUTE"), lambda value: value == "ON", 2)
 
-            self.say_lines([music_text.find("LINE_3").text])
+            self.say_lines([self.text("music", "LINE_3")])
             self.put_head_up()
         except Exception as ex:
             self.log(logging.ERROR, traceback.format_exc())
             
     def alexa(self):
         print("Alexa")
-        alexa_text = self.text_xml.find("alexa")
 
         try:
-            self.say_lines([alexa_text.find("LINE_1").text])
+            self.say_lines([self.text("alexa", "LINE_1")])
             time.sleep(1)
             
-            self.say_lines([alexa_text.find("LINE_2").text])
+            self.say_lines([self.text("alexa", "LINE_2")])
             time.sleep(2)
             
-            self.say_lines([alexa_text.find("LINE_3").text])
+            self.say_lines([self.text("alexa", "LINE_3")])
             time.sleep(0.5)
             
-            self.say_lines([alexa_text.find("LINE_4").text])
+            self.say_lines([self.text("alexa", "LINE_4")])
             self.animation_player.run("animations/Stand/BodyTalk/Listening/Listening_1")
             time.sleep(2)
             
@@ -181,17 +352,17 @@ class BasicBehaviour:
             self.animation_player.run("animations/Stand/BodyTalk/Listening/Listening_4")
             time.sleep(1)
             
-            self.say_lines([alexa_text.find("LINE_5").text])
+            self.say_lines([self.text("alexa", "LINE_5")])
             self.put_head_up()
             
-            self.say_lines([alexa_text.find("LINE_6").text, alexa_text.find("LINE_7").text])
+            self.say_lines([self.text("alexa", "LINE_6"), self.text("alexa", "LINE_7")])
             
-            if self.__stringToBoolean(self.app_config_xml.find("PROJECTOR_AUTOMATICALLY").text):
-                self.mqtt_connection_manager.publish_to_item(self.mqtt_topics_xml.find("Conference").find("projector").find("PROJECTOR").text, "ON")
+            if self.configuration.app.projector_automatically:
+                self.mqtt_connection_manager.publish_to_item(self.topics.item("Conference/projector/PROJECTOR"), "ON")
             
             time.sleep(1)
             
-            self.say_lines([alexa_text.find("LINE_8").text])
+            self.say_lines([self.text("alexa", "LINE_8")])
             self.put_head_up()
         
         except Exception as ex:
@@ -199,134 +370,164 @@ class BasicBehaviour:
 
     def roller_shutter(self):
         print("Roller shutter")
-        roller_shutter_text = self.text_xml.find("roller_shutter")
+
+        shutter_item = self.topics.item("Conference/roller_shutters/ROLLER_SHUTTER_2")
 
         try:
-            self.say_lines([roller_shutter_text.find("LINE_1").text])
-            self.motion.moveTo(0.0, 0.0, -0.785)
-            
-            self.behavior_manager.runBehavior("WTF")
-            self.say_lines([roller_shutter_text.find("LINE_2").text])
-            
-            self.mqtt_connection_manager.publish_to_item(self.mqtt_topics_xml.find("Conference").find("roller_shutters").find("ROLLER_SHUTTER_2").text, "DOWN")
-            time.sleep(12)
-            self.mqtt_connection_manager.publish_to_item(self.mqtt_topics_xml.find("Conference").find("roller_shutters").find("ROLLER_SHUTTER_2").text, "STOP")
-            
-            self.motion.moveTo(0.0, 0.0, 0.785)
-            self.say_lines([roller_shutter_text.find("LINE_3").text, roller_shutter_text.find("LINE_4").text, roller_shutter_text.find("LINE_5").text])
+            # Sprechen, während Pepper sich zum Rollladen dreht und wieder zurück
+            timeline = Timeline("roller_shutter")
+            timeline.track("speech", [
+                lambda: self.say_lines([self.text("roller_shutter", "LINE_1")]),
+                timeline.wait("turned"),
+                lambda: self.behavior_manager.runBehavior("WTF"),
+                lambda: self.say_lines([self.text("roller_shutter", "LINE_2")]),
+                timeline.signal("commanded"),
+                timeline.wait("shutter_stopped"),
+                lambda: self.say_lines([self.text("roller_shutter", "LINE_3"), self.text("roller_shutter", "LINE_4"), self.text("roller_shutter", "LINE_5")])
+            ])
+            timeline.track("motion", [
+                lambda: self.drive("ROLLER_SHUTTER_TURN"),
+                timeline.signal("turned"),
+                timeline.wait("shutter_stopped"),
+                lambda: self.drive("ROLLER_SHUTTER_RETURN")
+            ])
+            timeline.track("devices", [
+                timeline.wait("commanded"),
+                # Bis ROLLER_SHUTTER_STOP_POSITION herunterfahren; ohne Positionsmeldung wie bisher nach 12 Sekunden anhalten
+                lambda: self.lower_roller_shutter(shutter_item, self.configuration.app.roller_shutter_stop_position, 12),
+                timeline.signal("shutter_stopped")
+            ])
+            timeline.run()
         except Exception as ex:
             self.log(logging.ERROR, traceback.format_exc())
 
     def car_driving_training(self):
         print("Car driving training")
-        car_driving_training_text = self.text_xml.find("car_driving_training")
-
-        self.say_lines([car_driving_training_text.find("LINE_1").text])
-
-        def ssh_exec():
-            user = self.config_xml.find("SSH_USER").text
-            password = self.config_xml.find("SSH_PASSWORD").text
-            host = self.config_xml.find("SSH_HOST").text
-            port = self.config_xml.find("SSH_PORT").text
-            vlc_path = self.config_xml.find('VLC_PATH').text
-            movie_path = self.config_xml.find('MOVIE_PATH').text
-            output_buffer = ""
-            try:
-                ssh = paramiko.SSHClient()
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                print("Establishing Connection...")
-                ssh.connect(host, port, user, password)
-                print("Connection established.")
-                print("Creating EXEC Channel.")
-                stdin, stdout, stderr = ssh.exec_command(vlc_path + " " + movie_path)
-                output_buffer = stdout.read().decode()
-                ssh.close()
-            except (paramiko.SSHException, IOError) as e:
-                print(e)
-
-        thread = threading.Thread(target=ssh_exec)
-        thread.start()
 
-        time.sleep(1)
+        self.say_lines([self.text("car_driving_training", "LINE_1")])
+
+        # Video über die bereits aufgebaute SSH-Verbindung starten
+        process = None
+        try:
+            with self.tracer.span("ssh_exec", "ssh"):
+                process = self.ssh_pool.execute(self.configuration.system.vlc_path + " " + self.configuration.system.movie_path)
+        except (paramiko.SSHException, IOError) as e:
+            print(e)
 
         self.animation_player.run("animations/Stand/Waiting/DriveCar_1")
         self.animation_player.run("animations/Stand/Waiting/DriveCar_1")
 
-        # thread.stop()  # Avoid using thread.stop() as it's deprecated and unsafe
+        self.say_lines([self.text("car_driving_training", "LINE_2")])
 
-        self.say_lines([car_driving_training_text.find("LINE_2").text])
+        if process is not None:
+            process.stop()
 
-        self.mqtt_connection_manager.publish_to_item(self.mqtt_topics_xml.find("Conference").find("projector").find("PROJECTOR").text, "OFF")
+        self.mqtt_connection_manager.publish_to_item(self.topics.item("Conference/projector/PROJECTOR"), "OFF")
+
+        self.say_lines([self.text("car_driving_training", "LINE_3")])
 
-        self.say_lines([car_driving_training_text.find("LINE_3").text])
-    
     def kitchen(self):
         print("Kitchen")
-        kitchen_text = self.text_xml.find("kitchen")
-
-        kitchen_elements = self.mqtt_topics_xml.find('Kitchen')
-        if kitchen_elements is not None:
-            topics = kitchen_elements.find("lights")
 
         try:
             self.put_head_up()
 
-            self.say_lines([kitchen_text.find("LINE_1").text, kitchen_text.find("LINE_2").text])
-
-            self.mqtt_connection_manager.publish_to_item(self.mqtt_topics_xml.find("Conference").find("roller_shutters").find("ROLLER_SHUTTER_2").text, "UP")
-
-            self.motion.moveTo(0.0, 0.0, 0.785)
-            time.sleep(0.5)
-            self.motion.moveTo(3.3, 0.0, 0.0)
-            time.sleep(0.5)
-            self.motion.moveTo(0.0, 0.0, -1.5709)
-            time.sleep(0.5)
-            self.motion.moveTo(0.5, 0.0, 0.0)
-            time.sleep(0.5)
-            self.put_head_up()
-
-            self.say_lines([kitchen_text.find("LINE_3").text, kitchen_text.find("LINE_4").text])
-
-            # Licht anschalten
-            if self.__stringToBoolean(self.app_config_xml.find("LAMPS_INDIVIDUALLY").text):
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_1_SWITCH").text, "ON")
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_2_SWITCH").text, "ON")
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_3_SWITCH").text, "ON")
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_4_SWITCH").text, "ON")
-            else:
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_SWITCH").text, "ON")
-            
-            time.sleep(2)
-
-            self.say_lines([kitchen_text.find("LINE_5").text, kitchen_text.find("LINE_6").text, kitchen_text.find("LINE_7").text])
+            # Der Rollladen fährt schon während der Ansage hoch, das Licht geht auf dem letzten Stück an
+            timeline = Timeline("kitchen", cue_timeout=120)
+            timeline.track("speech", [
+                lambda: self.say_lines([self.text("kitchen", "LINE_1"), self.text("kitchen", "LINE_2")]),
+                timeline.signal("announced"),
+                timeline.wait("arrived"),
+                lambda: self.say_lines([self.text("kitchen", "LINE_3"), self.text("kitchen", "LINE_4")]),
+                timeline.wait("lights_on"),
+                lambda: self.say_lines([self.text("kitchen", "LINE_5"), self.text("kitchen", "LINE_6"), self.text("kitchen", "LINE_7")])
+            ])
+            timeline.track("motion", [
+                timeline.wait("announced"),
+                # Fährt bis "approaching" in einem Zug, das letzte Stück als eigener Abschnitt
+                lambda: self.drive("KITCHEN", lambda cue: timeline.signal(cue)()),
+                self.put_head_up,
+                timeline.signal("arrived")
+            ])
+            timeline.track("devices", [
+                lambda: self.mqtt_connection_manager.publish_to_item(self.topics.item("Conference/roller_shutters/ROLLER_SHUTTER_2"), "UP"),
+                timeline.wait("approaching"),
+                # Licht anschalten
+                lambda: self.switch_kitchen_lights("ON"),
+                timeline.signal("lights_on")
+            ])
+            timeline.run()
         except Exception as ex:
             self.log(logging.ERROR, traceback.format_exc())
 
     def farewell(self):
         print("Farewell")
-        farewell_text = self.text_xml.find("farewell")
-
-        kitchen_elements = self.mqtt_topics_xml.find('Kitchen')
-        if kitchen_elements is not None:
-            topics = kitchen_elements.find("lights")
 
         try:
             time.sleep(2)
-            self.say_lines([farewell_text.find("LINE_1").text])
-            self.motion.moveTo(-1.0, 0.0, 0.0)
-
-            if self.__stringToBoolean(self.app_config_xml.find("LAMPS_INDIVIDUALLY").text):
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_1_SWITCH").text, "OFF")
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_2_SWITCH").text, "OFF")
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_3_SWITCH").text, "OFF")
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_4_SWITCH").text, "OFF")
-            else:
-                self.mqtt_connection_manager.publish_to_item(topics.find("HUE_SWITCH").text, "OFF")
+            # Verabschieden, während Pepper zurückfährt und das Licht ausgeht
+            timeline = Timeline("farewell")
+            timeline.track("speech", [
+                lambda: self.say_lines([self.text("farewell", "LINE_1")])
+            ])
+            timeline.track("motion", [
+                lambda: self.drive("FAREWELL")
+            ])
+            timeline.track("devices", [
+                lambda: self.switch_kitchen_lights("OFF")
+            ])
+            timeline.run()
 
             self.motion.rest()
         except Exception as ex:
                 self.log(logging.ERROR, traceback.format_exc())
 
+    def drive(self, route_name, on_cue=None):
+        route = self.configuration.app.routes[route_name]
+        with self.tracer.span(route_name, "route"):
+            duration = self.routes.run(route, on_cue)
+        self.log(logging.DEBUG, "Route {} ({}, {} moveTo calls) took {:.3f}s".format(
+            route_name, route.mode, sum(1 for segment in route.segments if segment.cue is None), duration))
+
+    def lower_roller_shutter(self, item, position, timeout):
+        """
+        Fährt den Rollladen herunter und hält ihn an, sobald er nach dem Befehl mindestens position Prozent meldet.
+        Ohne position wird nach timeout Sekunden angehalten.
+        """
+        started = time.time()
+        self.mqtt_connection_manager.publish_to_item(item, "DOWN")
+        if position is None:
+            time.sleep(timeout)
+        else:
+            self.wait_for_state(item, lambda value: self.shutter_position(value) >= position, timeout, since=started)
+        self.mqtt_connection_manager.publish_to_item(item, "STOP")
+
+    def shutter_position(self, value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return -1
+
+    def switch_kitchen_lights(self, state):
+        if self.configuration.app.lamps_individually:
+            self.publish_group("KITCHEN_LIGHTS", state)
+            light_item = self.topics.item("Kitchen/lights/HUE_4_SWITCH")
+        else:
+            self.mqtt_connection_manager.publish_to_item(self.topics.item("Kitchen/lights/HUE_SWITCH"), state)
+            light_item = self.topics.item("Kitchen/lights/HUE_SWITCH")
+
+        self.wait_for_state(light_item, lambda value: value == state, 2)
+
+    def publish_group(self, name, payload=None):
+        batch = self.mqtt_connection_manager.publish_group(self.topics.group(name), payload, self.configuration.system.mqtt_ack_timeout)
+        if batch.duration is None:
+            self.log(logging.WARNING, "Group {}: {} of {} messages not acknowledged within {}s".format(
+                name, batch.outstanding, batch.published, self.configuration.system.mqtt_ack_timeout))
+        else:
+            self.log(logging.DEBUG, "Group {}: {} published, {} skipped, {} failed, acknowledged after {:.3f}s".format(
+                name, batch.published, batch.skipped, batch.failed, batch.duration))
+        return batch
+
     def put_head_up(self):
         try:
             self.motion.angleInterpolationWithSpeed("Head", [0.0, -0.3], 0.3)
@@ -334,52 +535,93 @@ class BasicBehaviour:
             self.log(logging.ERROR, traceback.format_exc())
 
     def log(self, severity, message):
-        if self.__stringToBoolean(self.config_xml.find("DEBUG").text):
+        if self.configuration.system.debug:
             if self.logger:  # Sicherstellen, dass der Logger initialisiert wurde
-                caller_frame = inspect.stack()[1]
-                caller_file = caller_frame[1]
-                caller_line = caller_frame[2]
-                self.logger.error("%s - File: %s, Line: %d - %s", str(severity), caller_file, caller_line, str(message))
+                self.logger.log(severity, str(message), sys._getframe(1))
             else:
                 print("Logger wurde nicht initialisiert:", severity, message)  # Alternativ: Auf die Konsole ausgeben
 
     def init_logger(self):
-        self.logger = logging.getLogger("BasicBehaviour")
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        file_handler = logging.FileHandler("pepper_" + time.strftime("%d_%m_%Y_%H_%M") + ".log")
-        file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
-        self.logger.setLevel(logging.DEBUG)
+        system = self.configuration.system
+        # Unter dem Supervisor eigene Log-Datei je Roboter
+        prefix = "pepper_" if self.name is None else "pepper_" + self.name + "_"
+        self.logger = LogPipeline("BasicBehaviour" if self.name is None else "BasicBehaviour." + self.name,
+                                  prefix + time.strftime("%d_%m_%Y_%H_%M") + ".log",
+                                  system.log_level,
+                                  system.log_max_bytes,
+                                  system.log_backup_count,
+                                  system.log_queue_size)
 
     def say_lines(self, lines):
-        for line in lines:
-            self.animated_speech.say(line)
+        timings = self.speech.say_lines(lines)
+        for index, timing in enumerate(timings):
+            self.tracer.record("say", "speech", timing.issued, timing.finished - timing.issued)
+            self.log(logging.DEBUG, "say_lines: line {}/{} took {:.3f}s, gap {:.3f}s".format(index + 1, len(timings), timing.finished - timing.issued, timing.gap))
+
+    def text(self, section, line):
+        return self.configuration.text(section, line)
+
+    def get_device_state(self, item, max_age=None):
+        return self.state_cache.get(item, max_age)
+
+    def wait_for_state(self, item, predicate, timeout, since=None):
+        """
+        Wartet, bis das Gerät den erwarteten Zustand meldet. Nach timeout Sekunden wird wie bisher
+        mit fester Verzögerung fortgefahren.
+        """
+        start = time.time()
+        matched, value = self.state_cache.wait_for(item, predicate, timeout, since)
+        self.log(logging.INFO, "wait_for_state {}: {} after {:.3f}s (timeout {}s, value {})".format(
+            item, "matched" if matched else "timed out", time.time() - start, timeout, value))
+        return matched
+
+    def close_tracer(self):
+        if not self.tracer.enabled:
+            return
+        self.tracer.close()
+        if self.configuration.system.trace_chrome_file is not None:
+            self.tracer.export_chrome(self.configuration.system.trace_chrome_file)
 
     def disconnect_all(self):
+        self.finished = True
+        if self.owns_reloader:
+            self.reloader.stop()
+        if self.supervised:
+            # Gemeinsame Ressourcen schließt der Supervisor; der Prozess läuft für die anderen Roboter weiter
+            self.memory_writer.stop()
+            if self.logger:
+                self.logger.stop()
+            return
+
         self.mqtt_connection_manager.disconnect()
+        self.memory_writer.stop()
+        self.ssh_pool.close()
+        self.close_tracer()
+        if self.logger:
+            self.logger.stop()
         self.application.stop()
         sys.exit()
 
     def on_subscription(self, item, value):
-        item_description = item.split("/")[3]
-        print("onSubscription:", item_description)
-
-        if item_description in [self.mqtt_topics_xml.find("Conference").find("WINDOW1").text, self.mqtt_topics_xml.find("Conference").find("WINDOW2").text,
-                                self.mqtt_topics_xml.find("Conference").find("WINDOW3").text, self.mqtt_topics_xml.find("Conference").find("WINDOW4").text,
-                                self.mqtt_topics_xml.find("Conference").find("WINDOW5").text, self.mqtt_topics_xml.find("Conference").find("WINDOW6").text,
-                                self.mqtt_topics_xml.find("Multimedia").find("WINDOW1").text, self.mqtt_topics_xml.find("Multimedia").find("WINDOW2").text,
-                                self.mqtt_topics_xml.find("Multimedia").find("WINDOW3").text]:
-            try:
-                if value == "OPEN":
-                    print("onSubscription:", item_description, value)
-                    self.memory.raise_event("WindowOpend", item_description)
-                elif value == "CLOSED":
-                    print("onSubscription:", item_description, value)
-                    self.memory.raise_event("WindowClosed", item_description)
-            except Exception as ex:
-                self.log(logging.ERROR, traceback.format_exc())
-        else:
-            try:
-                self.memory.insert_data(item, value)
-            except Exception as ex:
-                self.log(logging.ERROR, traceback.format_exc())
+        with self.tracer.span("on_subscription", "mqtt"):
+            route = self.topic_index.lookup(item)
+            if route is None:
+                self.on_memory_state(item, None, value)
+            else:
+                self.subscription_handlers[route.handler](item, route, value)
+
+    def on_window_state(self, item, route, value):
+        event = route.events.get(value)
+        if event is None:
+            return
+        try:
+            self.log(logging.DEBUG, "onSubscription: {} {}".format(route.item, value))
+            self.memory.raise_event(event, route.item)
+        except Exception as ex:
+            self.log(logging.ERROR, traceback.format_exc())
+
+    def on_memory_state(self, item, route, value):
+        try:
+            self.memory_writer.insert(item, value)
+        except Exception as ex:
+            self.log(logging.ERROR, traceback.format_exc())
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import sys
+import threading
+import time
+from BasicBehaviour import BasicBehaviour
+from Configuration import Configuration, load_configuration
+from Simulation import SimulatedApplication, SimulatedMessage
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def simulated_configuration(configuration):
+    """
+    Schnappschuss für den Benchmark: Simulationsmodus an, Datei-Logging aus.
+    """
+    system = configuration.system._replace(simulation=True, debug=False)
+    return Configuration(system, configuration.app, configuration.topics, configuration.texts)
+
+def without_rate_limit(configuration):
+    """
+    Schnappschuss ohne MQTT_RATE_LIMIT, damit Messungen den Dispatch-Pfad und nicht die Drosselung erfassen.
+    """
+    system = configuration.system._replace(mqtt_rate_limit=0.0)
+    return Configuration(system, configuration.app, configuration.topics, configuration.texts)
+
+def create_behaviour(configuration):
+    application = SimulatedApplication(configuration)
+    return BasicBehaviour(application, application.session, configuration)
+
+def benchmark_tour(configuration):
+    """
+    Führt presentation() gegen die Simulation aus und misst Gesamtzeit und Zeit je Szene.
+    """
+    behaviour = create_behaviour(configuration)
+    scene_times = []
+
+    for scene in configuration.app.enabled_functions:
+        method_name = scene.lower()
+        method = getattr(behaviour, method_name)
+
+        def timed(method=method, scene=scene):
+            start = time.time()
+            try:
+                return method()
+            finally:
+                scene_times.append((scene, time.time() - start))
+        setattr(behaviour, method_name, timed)
+
+    start = time.time()
+    try:
+        behaviour.presentation()
+    except SystemExit:
+        pass
+    return {"tour_seconds": time.time() - start, "scenes": scene_times}
+
+def benchmark_flood(configuration, message_count):
+    """
+    Schickt message_count Nachrichten durch MQTTConnectionManager.on_message und misst Durchsatz
+    sowie die Latenz bis zum Ende von on_subscription. Die Drosselung je Topic ist dabei abgeschaltet.
+    """
+    configuration = without_rate_limit(configuration)
+    behaviour = create_behaviour(configuration)
+    manager = behaviour.mqtt_connection_manager
+    topic_base = configuration.system.mqtt_subscribe_topic_base
+    topics = configuration.topics.index.topics() + [topic_base + "Unknown_Item_" + str(index) for index in range(50)]
+
+    messages = []
+    for index in range(message_count):
+        messages.append(SimulatedMessage(topics[index % len(topics)], "OPEN" if index % 2 else str(index)))
+
+    sent = [0.0] * message_count
+    latencies = []
+    all_done = threading.Event()
+    lock = threading.Lock()
+    on_subscription = behaviour.on_subscription
+    pending = {}
+
+    def timed_on_subscription(item, value):
+        on_subscription(item, value)
+        now = time.time()
+        with lock:
+            index = pending[(item, value)].pop(0)
+            latencies.append(now - sent[index])
+            if len(latencies) >= message_count - manager.rejected_messages():
+                all_done.set()
+    behaviour.on_subscription = timed_on_subscription
+
+    for index, message in enumerate(messages):
+        pending.setdefault((message.topic, message.payload.decode()), []).append(index)
+
+    start = time.time()
+    for index, message in enumerate(messages):
+        rejected = manager.rejected_messages()
+        sent[index] = time.time()
+        manager.on_message(None, None, message)
+        if manager.rejected_messages() != rejected:
+            with lock:
+                pending[(message.topic, message.payload.decode())].remove(index)
+    all_done.wait(60)
+    elapsed = time.time() - start
+
+    try:
+        behaviour.disconnect_all()
+    except SystemExit:
+        pass
+
+    return {"messages": message_count,
+            "dropped": manager.dropped_messages + manager.dropped_priority_messages,
+            "throttled": manager.throttled_messages,
+            "filtered": manager.filtered_messages,
+            "messages_per_second": len(latencies) / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the tour against the simulation backend")
+    parser.add_argument("--messages", type=int, default=20000, help="number of messages for the on_subscription flood")
+    parser.add_argument("--skip-tour", action="store_true", help="only run the on_subscription flood")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--max-tour-seconds", type=float, help="fail if the tour takes longer")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if the p99 dispatch latency is higher")
+    args = parser.parse_args()
+
+    configuration = simulated_configuration(load_configuration())
+    results = {}
+    failed = False
+
+    if not args.skip_tour:
+        results["tour"] = benchmark_tour(configuration)
+        print("Tour: {:.2f}s".format(results["tour"]["tour_seconds"]))
+        for scene, seconds in results["tour"]["scenes"]:
+            print("  {:<24} {:.2f}s".format(scene, seconds))
+        if args.max_tour_seconds is not None and results["tour"]["tour_seconds"] > args.max_tour_seconds:
+            print("Tour slower than {:.2f}s".format(args.max_tour_seconds))
+            failed = True
+
+    results["flood"] = benchmark_flood(configuration, args.messages)
+    flood = results["flood"]
+    print("on_subscription flood: {} messages, {} dropped, {} throttled, {} filtered, {:.0f} msg/s, p50 {:.3f}ms, p99 {:.3f}ms".format(
+        flood["messages"], flood["dropped"], flood["throttled"], flood["filtered"], flood["messages_per_second"], flood["p50_ms"], flood["p99_ms"]))
+    if args.max_p99_ms is not None and flood["p99_ms"] > args.max_p99_ms:
+        print("p99 dispatch latency above {:.3f}ms".format(args.max_p99_ms))
+        failed = True
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
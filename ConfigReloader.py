@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+import traceback
+from Configuration import Configuration, load_app_config, load_texts, CONFIG_DIRECTORY
+
+class ConfigReloader(object):
+    """
+    Überwacht text.xml und app.xml und lädt nur die geänderte Datei neu. Das Parsen und Validieren
+    läuft im eigenen Thread; danach wird der Schnappschuss in configuration ersetzt.
+    Verbraucher lesen configuration zwischen den Szenen, eine Szene sieht so nie einen gemischten Stand.
+    Ist die neue Datei ungültig, bleibt der alte Schnappschuss aktiv.
+    """
+    def __init__(self, configuration, directory=CONFIG_DIRECTORY, interval=1.0, on_error=None):
+        self.configuration = configuration
+        self.interval = interval
+        self.on_error = on_error
+        self.loaders = {
+            os.path.join(directory, "text.xml"): self.__reload_texts,
+            os.path.join(directory, "app.xml"): self.__reload_app
+        }
+        self.signatures = dict((path, self.__signature(path)) for path in self.loaders)
+
+        self.reloads = 0
+        self.failures = 0
+        self.last_reload = None
+        self.running = True
+        self.thread = threading.Thread(target=self.__watch, name="ConfigReloader")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def check(self):
+        """
+        Prüft alle Dateien einmal auf Änderungen und liefert die Liste der neu geladenen Dateien.
+        """
+        reloaded = []
+        for path, loader in self.loaders.items():
+            signature = self.__signature(path)
+            if signature == self.signatures[path]:
+                continue
+            self.signatures[path] = signature
+
+            start = time.time()
+            try:
+                configuration = loader(path)
+            except Exception as e:
+                self.failures += 1
+                self.__report("Reload of {} failed, keeping the previous configuration: {}".format(os.path.basename(path), e))
+                continue
+            parse_seconds = time.time() - start
+
+            self.configuration = configuration
+            self.reloads += 1
+            self.last_reload = (os.path.basename(path), parse_seconds)
+            reloaded.append(path)
+        return reloaded
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+
+    def get_statistics(self):
+        return {"reloads": self.reloads,
+                "failures": self.failures,
+                "last_file": self.last_reload[0] if self.last_reload else None,
+                "last_parse_seconds": self.last_reload[1] if self.last_reload else 0.0}
+
+    def __reload_texts(self, path):
+        current = self.configuration
+        return Configuration(current.system, current.app, current.topics, load_texts(path))
+
+    def __reload_app(self, path):
+        current = self.configuration
+        return Configuration(current.system, load_app_config(path), current.topics, current.texts)
+
+    def __signature(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+    def __report(self, message):
+        if self.on_error is not None:
+            self.on_error(message)
+        else:
+            print(message)
+
+    def __watch(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                self.check()
+            except Exception:
+                self.__report(traceback.format_exc())
@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple, OrderedDict
+from Navigation import Waypoint, compile_route
+from StateCache import read_ttls
+from SubscriptionPlanner import ALWAYS
+from TopicIndex import TopicIndex, GROUPS_TAG, SUBSCRIPTIONS_TAG, SECTION_TAGS
+
+CONFIG_DIRECTORY = "config"
+
+# Szenen der Präsentation in der Reihenfolge, in der sie ausgeführt werden
+SCENES = ("WELCOME", "MUSIC", "ALEXA", "ROLLER_SHUTTER", "CAR_DRIVING_TRAINING", "KITCHEN", "FAREWELL")
+
+# Routen aus der app.xml, die von den Szenen gefahren werden
+REQUIRED_ROUTES = ("ROLLER_SHUTTER_TURN", "ROLLER_SHUTTER_RETURN", "KITCHEN", "FAREWELL")
+
+# Synchronisationspunkte, auf die die Timeline einer Szene während der Fahrt wartet
+REQUIRED_CUES = {
+    "KITCHEN": ("approaching",)
+}
+
+def _string(text):
+    if text is None or text.strip() == "":
+        raise ValueError("must not be empty")
+    return text.strip()
+
+def _optional_string(text):
+    if text is None or text.strip() == "":
+        return None
+    return text.strip()
+
+def _pattern_list(text):
+    # Kommagetrennte Muster im fnmatch-Stil, z.B. "*_Stromzaehler_*, *_Leistung"
+    if text is None or text.strip() == "":
+        return ()
+    return tuple(pattern.strip() for pattern in text.split(",") if pattern.strip() != "")
+
+def _boolean(text):
+    value = _string(text).lower()
+    if value == "true":
+        return True
+    if value == "false":
+        return False
+    raise ValueError("expected True or False, got '{}'".format(text))
+
+def _integer(text):
+    return int(_string(text))
+
+def _positive_integer(text):
+    value = _integer(text)
+    if value < 1:
+        raise ValueError("must be positive, got {}".format(value))
+    return value
+
+def _port(text):
+    value = _integer(text)
+    if value < 1 or value > 65535:
+        raise ValueError("not a valid port: {}".format(value))
+    return value
+
+def _qos(text):
+    value = _integer(text)
+    if value not in (0, 1, 2):
+        raise ValueError("QoS must be 0, 1 or 2, got {}".format(value))
+    return value
+
+def _positive_float(text):
+    value = float(_string(text))
+    if value <= 0:
+        raise ValueError("must be positive, got {}".format(value))
+    return value
+
+def _log_level(text):
+    value = _string(text).upper()
+    if value not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+        raise ValueError("unknown log level '{}'".format(text))
+    return getattr(logging, value)
+
+def _non_negative_float(text):
+    value = float(_string(text))
+    if value < 0:
+        raise ValueError("must not be negative, got {}".format(value))
+    return value
+
+def _optional_percentage(text):
+    value = _optional_string(text)
+    if value is None:
+        return None
+    value = float(value)
+    if value < 0 or value > 100:
+        raise ValueError("must be between 0 and 100, got {}".format(value))
+    return value
+
+def _tls_version(text):
+    value = _optional_string(text)
+    if value not in (None, "1.2", "1.3"):
+        raise ValueError("unsupported TLS version '{}'".format(value))
+    return value
+
+def _transport(text):
+    value = _string(text)
+    if value not in ("tcp", "websockets"):
+        raise ValueError("unsupported transport '{}'".format(value))
+    return value
+
+SYSTEM_FIELDS = (
+    ("ROBOT_URL", "robot_url", _string),
+    ("ROBOT_PORT", "robot_port", _port),
+    ("HEADLESS", "headless", _boolean),
+    ("DEBUG", "debug", _boolean),
+    ("LOG_LEVEL", "log_level", _log_level),
+    ("LOG_MAX_BYTES", "log_max_bytes", _positive_integer),
+    ("LOG_BACKUP_COUNT", "log_backup_count", _positive_integer),
+    ("LOG_QUEUE_SIZE", "log_queue_size", _positive_integer),
+    ("SONOS_URL", "sonos_url", _optional_string),
+    ("MUSIC_URL", "music_url", _string),
+    ("VLC_PATH", "vlc_path", _string),
+    ("MOVIE_PATH", "movie_path", _string),
+    ("SSH_USER", "ssh_user", _string),
+    ("SSH_PASSWORD", "ssh_password", _optional_string),
+    ("SSH_HOST", "ssh_host", _string),
+    ("SSH_PORT", "ssh_port", _port),
+    ("SSH_KEEPALIVE_INTERVAL", "ssh_keepalive_interval", _positive_float),
+    ("SSH_RECONNECT_DELAY", "ssh_reconnect_delay", _positive_float),
+    ("SSH_CHECK_INTERVAL", "ssh_check_interval", _positive_float),
+    ("SSH_CONNECT_TIMEOUT", "ssh_connect_timeout", _positive_float),
+    ("MQTT_BROKER_TRANSPORT", "mqtt_broker_transport", _transport),
+    ("MQTT_BROKER_IP", "mqtt_broker_ip", _string),
+    ("MQTT_BROKER_PORT", "mqtt_broker_port", _port),
+    ("MQTT_CLIENT_ID", "mqtt_client_id", _string),
+    ("MQTT_TLS_PATH", "mqtt_tls_path", _optional_string),
+    ("MQTT_TLS_VERSION", "mqtt_tls_version", _tls_version),
+    ("MQTT_BROKER_USER", "mqtt_broker_user", _optional_string),
+    ("MQTT_BROKER_PASSWORD", "mqtt_broker_password", _optional_string),
+    ("MQTT_BROKER_QOS", "mqtt_broker_qos", _qos),
+    ("MQTT_RETAIN", "mqtt_retain", _boolean),
+    ("MQTT_RECONNECT_MIN_DELAY", "mqtt_reconnect_min_delay", _positive_float),
+    ("MQTT_RECONNECT_MAX_DELAY", "mqtt_reconnect_max_delay", _positive_float),
+    ("MQTT_OFFLINE_QUEUE_SIZE", "mqtt_offline_queue_size", _positive_integer),
+    ("MQTT_OFFLINE_TTL", "mqtt_offline_ttl", _positive_float),
+    ("MQTT_PUBLISH_TOPIC_BASE", "mqtt_publish_topic_base", _string),
+    ("MQTT_SUBSCRIBE_TOPIC_BASE", "mqtt_subscribe_topic_base", _string),
+    ("MQTT_DISPATCH_QUEUE_SIZE", "mqtt_dispatch_queue_size", _positive_integer),
+    ("MQTT_DISPATCH_WORKERS", "mqtt_dispatch_workers", _positive_integer),
+    ("MQTT_ACK_TIMEOUT", "mqtt_ack_timeout", _positive_float),
+    ("MQTT_TOPIC_ALLOW", "mqtt_topic_allow", _pattern_list),
+    ("MQTT_TOPIC_DENY", "mqtt_topic_deny", _pattern_list),
+    ("MQTT_RATE_LIMIT", "mqtt_rate_limit", _non_negative_float),
+    ("MQTT_RATE_BURST", "mqtt_rate_burst", _positive_integer),
+    ("MQTT_SUBSCRIBE_ALL", "mqtt_subscribe_all", _boolean),
+    ("MQTT_MIRROR_ITEMS", "mqtt_mirror_items", _boolean),
+    ("TRAFFIC_RECORD_FILE", "traffic_record_file", _optional_string),
+    ("TRAFFIC_RECORD_QUEUE_SIZE", "traffic_record_queue_size", _positive_integer),
+    ("MEMORY_WRITER_SYNC", "memory_writer_sync", _boolean),
+    ("MEMORY_WRITER_FLUSH_INTERVAL", "memory_writer_flush_interval", _positive_float),
+    ("MEMORY_WRITER_MAX_BATCH", "memory_writer_max_batch", _positive_integer),
+    ("STATE_CACHE_TTL", "state_cache_ttl", _positive_float),
+    ("TRACE_ENABLED", "trace_enabled", _boolean),
+    ("TRACE_CAPACITY", "trace_capacity", _positive_integer),
+    ("TRACE_RING_FILE", "trace_ring_file", _optional_string),
+    ("TRACE_RING_CAPACITY", "trace_ring_capacity", _positive_integer),
+    ("TRACE_FLUSH_INTERVAL", "trace_flush_interval", _positive_float),
+    ("TRACE_CHROME_FILE", "trace_chrome_file", _optional_string),
+    ("CONFIG_RELOAD", "config_reload", _boolean),
+    ("CONFIG_RELOAD_INTERVAL", "config_reload_interval", _positive_float),
+    ("SIMULATION", "simulation", _boolean),
+    ("SIMULATION_RPC_LATENCY", "simulation_rpc_latency", _non_negative_float),
+    ("SIMULATION_SPEECH_LATENCY", "simulation_speech_latency", _non_negative_float),
+    ("SIMULATION_MOTION_LATENCY", "simulation_motion_latency", _non_negative_float),
+    ("SIMULATION_ANIMATION_LATENCY", "simulation_animation_latency", _non_negative_float),
+    ("SIMULATION_DEVICE_LATENCY", "simulation_device_latency", _non_negative_float),
+    ("SIMULATION_SHUTTER_TRAVEL_TIME", "simulation_shutter_travel_time", _positive_float),
+    ("SIMULATION_SSH_LATENCY", "simulation_ssh_latency", _non_negative_float)
+)
+
+APP_FIELDS = (
+    ("APP_NAME", "app_name", _string),
+    ("LANGUAGE", "language", _string),
+    ("LAMPS_INDIVIDUALLY", "lamps_individually", _boolean),
+    ("VENETIAN_BLINDS_INDIVIDUALLY", "venetian_blinds_individually", _boolean),
+    ("ROLLER_SHUTTERS_INDIVIDUALLY", "roller_shutters_individually", _boolean),
+    ("DOORS_INDIVIDUALLY", "doors_individually", _boolean),
+    ("PROJECTOR_AUTOMATICALLY", "projector_automatically", _boolean),
+    ("ROLLER_SHUTTER_STOP_POSITION", "roller_shutter_stop_position", _optional_percentage)
+)
+
+# Mitglied einer Gerätegruppe; payload None bedeutet: Payload des Aufrufs verwenden
+GroupMember = namedtuple("GroupMember", ["item", "payload", "force"])
+
+# Roboter, die der Supervisor gleichzeitig aus einem Prozess steuert (robots.xml)
+RobotConfig = namedtuple("RobotConfig", ["name", "url", "port"])
+
+SystemConfig = namedtuple("SystemConfig", [field[1] for field in SYSTEM_FIELDS])
+AppConfig = namedtuple("AppConfig", [field[1] for field in APP_FIELDS] + ["functions", "enabled_functions", "routes"])
+
+def _read_fields(root, fields, file_name):
+    values = []
+    for tag, name, parser in fields:
+        element = root.find(tag)
+        if element is None:
+            raise ValueError("Missing <{}> in {}".format(tag, file_name))
+        try:
+            values.append(parser(element.text))
+        except ValueError as e:
+            raise ValueError("Invalid value for <{}> in {}: {}".format(tag, file_name, e))
+    return values
+
+class MqttTopics(object):
+    """
+    Items aus der mqtt_topics.xml, adressiert über ihren Pfad (z.B. "Kitchen/lights/HUE_SWITCH").
+    """
+    __slots__ = ("items", "ttls", "index", "groups", "subscriptions")
+
+    def __init__(self, root, subscribe_topic_base):
+        self.items = {}
+        self.__collect(root, "")
+        self.ttls = read_ttls(root)
+        self.index = TopicIndex(root, subscribe_topic_base)
+        self.groups = {}
+        for groups in root.findall(GROUPS_TAG):
+            for group in groups:
+                self.groups[group.tag] = tuple(self.__member(group.tag, member) for member in group)
+        # Zusätzliche Abonnements aus <Subscriptions>, z.B. ALWAYS für die Fenster
+        self.subscriptions = {}
+        for section in root.findall(SUBSCRIPTIONS_TAG):
+            for scene in section:
+                if scene.tag != ALWAYS and scene.tag not in SCENES:
+                    raise ValueError("Unknown scene <{}> in <{}>".format(scene.tag, SUBSCRIPTIONS_TAG))
+                self.subscriptions[scene.tag] = tuple(sorted(set(item for entry in scene for item in self.__items_below(scene.tag, entry))))
+
+    def __collect(self, element, prefix):
+        for child in element:
+            if child.tag in SECTION_TAGS:
+                continue
+            path = prefix + child.tag
+            if len(child) > 0:
+                self.__collect(child, path + "/")
+            elif child.text is not None and child.text.strip() != "":
+                self.items[path] = child.text.strip()
+
+    def item(self, path):
+        return self.items[path]
+
+    def group(self, name):
+        """
+        Liefert die Mitglieder einer Gerätegruppe als Tupel von GroupMember.
+        """
+        return self.groups[name]
+
+    def scene_subscriptions(self, scene_topics, scene_groups):
+        """
+        Liefert je Szene die Items aus scene_topics (Pfade) und den Mitgliedern der Gruppen aus scene_groups,
+        ergänzt um die Einträge aus <Subscriptions>.
+        """
+        subscriptions = dict((scene, set(items)) for scene, items in self.subscriptions.items())
+        for scene, paths in scene_topics.items():
+            subscriptions.setdefault(scene, set()).update(self.items[path] for path in paths)
+        for scene, names in scene_groups.items():
+            subscriptions.setdefault(scene, set()).update(member.item for name in names for member in self.groups[name])
+        return dict((scene, tuple(sorted(items))) for scene, items in subscriptions.items())
+
+    def __items_below(self, scene, entry):
+        # Ein Eintrag ist ein Item-Pfad oder ein Präfix wie "Conference/windows"
+        path = (entry.text or "").strip()
+        items = [item for item_path, item in self.items.items() if item_path == path or item_path.startswith(path + "/")]
+        if not items:
+            raise ValueError("Subscription <{}> references unknown path '{}'".format(scene, path))
+        return items
+
+    def __member(self, group, member):
+        path = (member.text or "").strip()
+        if path not in self.items:
+            raise ValueError("Group <{}> references unknown item '{}'".format(group, path))
+        try:
+            force = _boolean(member.get("force", "False"))
+        except ValueError as e:
+            raise ValueError("Invalid force attribute in group <{}>: {}".format(group, e))
+        return GroupMember(self.items[path], member.get("payload"), force)
+
+class Configuration(object):
+    """
+    Einmalig geladener, validierter Schnappschuss von config.xml, app.xml, mqtt_topics.xml und text.xml,
+    der von Pepper, BasicBehaviour und MQTTConnectionManager gemeinsam genutzt wird.
+    """
+    __slots__ = ("system", "app", "topics", "texts")
+
+    def __init__(self, system, app, topics, texts):
+        self.system = system
+        self.app = app
+        self.topics = topics
+        self.texts = texts
+
+    def text(self, section, line):
+        return self.texts[section][line]
+
+def load_system_config(path):
+    root = ET.parse(path).getroot()
+    return SystemConfig(*_read_fields(root, SYSTEM_FIELDS, os.path.basename(path)))
+
+def load_app_config(path):
+    root = ET.parse(path).getroot()
+    file_name = os.path.basename(path)
+
+    config_element = root.find("config")
+    functions_element = root.find("functions")
+    if config_element is None or functions_element is None:
+        raise ValueError("Missing <config> or <functions> in " + file_name)
+
+    values = _read_fields(config_element, APP_FIELDS, file_name)
+    functions = OrderedDict()
+    for scene, enabled in zip(SCENES, _read_fields(functions_element, [(scene, scene, _boolean) for scene in SCENES], file_name)):
+        functions[scene] = enabled
+    enabled_functions = tuple(scene for scene in SCENES if functions[scene])
+    routes = _read_routes(root.find("routes"), file_name)
+    return AppConfig(*(values + [functions, enabled_functions, routes]))
+
+def _read_routes(routes_element, file_name):
+    routes = OrderedDict()
+    if routes_element is not None:
+        for route in routes_element:
+            steps = []
+            for step in route:
+                try:
+                    if step.tag == "WAYPOINT":
+                        steps.append(Waypoint(float(step.get("x", "0")), float(step.get("y", "0")), float(step.get("theta", "0"))))
+                    elif step.tag == "CUE":
+                        steps.append(_string(step.get("name")))
+                    else:
+                        raise ValueError("unknown step <{}>".format(step.tag))
+                except ValueError as e:
+                    raise ValueError("Invalid route <{}> in {}: {}".format(route.tag, file_name, e))
+            routes[route.tag] = compile_route(route.tag, route.get("mode", "trajectory"), steps)
+    for required in REQUIRED_ROUTES:
+        if required not in routes:
+            raise ValueError("Missing route <{}> in {}".format(required, file_name))
+    for route_name, cues in REQUIRED_CUES.items():
+        for cue in cues:
+            if cue not in routes[route_name].steps:
+                raise ValueError("Missing <CUE name=\"{}\"/> in route <{}> in {}".format(cue, route_name, file_name))
+    return routes
+
+def load_topics(path, subscribe_topic_base):
+    return MqttTopics(ET.parse(path).getroot(), subscribe_topic_base)
+
+def check_topics(topics, required_topics, required_groups, file_name="mqtt_topics.xml"):
+    """
+    Prüft, ob die mqtt_topics.xml alle Items und Gerätegruppen enthält, die die Szenen verwenden.
+    """
+    for required in required_topics:
+        if required not in topics.items:
+            raise ValueError("Missing topic {} in {}".format(required, file_name))
+    for required in required_groups:
+        if required not in topics.groups:
+            raise ValueError("Missing group <{}> in {}".format(required, file_name))
+
+def load_texts(path):
+    root = ET.parse(path).getroot()
+    file_name = os.path.basename(path)
+    texts = {}
+    for section in root:
+        lines = {}
+        for line in section:
+            if line.text is None or line.text.strip() == "":
+                raise ValueError("Empty text <{}>/<{}> in {}".format(section.tag, line.tag, file_name))
+            lines[line.tag] = line.text.strip()
+        texts[section.tag] = lines
+    for scene in SCENES:
+        if scene.lower() not in texts:
+            raise ValueError("Missing text section <{}> in {}".format(scene.lower(), file_name))
+    return texts
+
+def load_robots(path):
+    root = ET.parse(path).getroot()
+    file_name = os.path.basename(path)
+    robots = []
+    for robot in root.findall("ROBOT"):
+        try:
+            robots.append(RobotConfig(_string(robot.get("name")), _string(robot.get("url")), _port(robot.get("port", "9559"))))
+        except ValueError as e:
+            raise ValueError("Invalid <ROBOT> in {}: {}".format(file_name, e))
+    names = [robot.name for robot in robots]
+    if not robots:
+        raise ValueError("No <ROBOT> in " + file_name)
+    if len(set(names)) != len(names):
+        raise ValueError("Duplicate robot names in " + file_name)
+    return tuple(robots)
+
+def load_configuration(directory=CONFIG_DIRECTORY):
+    system = load_system_config(os.path.join(directory, "config.xml"))
+    app = load_app_config(os.path.join(directory, "app.xml"))
+    topics = load_topics(os.path.join(directory, "mqtt_topics.xml"), system.mqtt_subscribe_topic_base)
+    texts = load_texts(os.path.join(directory, "text.xml"))
+    return Configuration(system, app, topics, texts)
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import logging
+import logging.handlers
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+class QueueHandler(logging.Handler):
+    """
+    Legt Log-Records nur in eine begrenzte Queue; Formatieren und Schreiben übernimmt der Writer-Thread.
+    Ist die Queue voll, wird der Record verworfen statt den aufrufenden Thread zu blockieren.
+    """
+    def __init__(self, record_queue):
+        logging.Handler.__init__(self)
+        self.record_queue = record_queue
+        self.dropped_records = 0
+
+    def emit(self, record):
+        try:
+            self.record_queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_records += 1
+
+class LogPipeline(object):
+    """
+    Asynchrones Logging: Aufrufer schreiben in eine Queue, ein Hintergrund-Thread schreibt
+    in eine rotierende Log-Datei mit Größenbegrenzung.
+    """
+    def __init__(self, name, file_name, level=logging.DEBUG, max_bytes=1048576, backup_count=5, queue_size=10000):
+        self.record_queue = queue.Queue(queue_size)
+
+        self.file_handler = logging.handlers.RotatingFileHandler(file_name, maxBytes=max_bytes, backupCount=backup_count)
+        self.file_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - File: %(pathname)s, Line: %(lineno)d - %(message)s"))
+
+        self.queue_handler = QueueHandler(self.record_queue)
+
+        self.logger = logging.getLogger(name)
+        self.logger.addHandler(self.queue_handler)
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+
+        self.thread = threading.Thread(target=self.__write_records, name="LogWriter")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def log(self, level, message, caller_frame):
+        """
+        Loggt mit Datei und Zeile des übergebenen Frames, ohne den Stack zu inspizieren.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        record = self.logger.makeRecord(self.logger.name, level, caller_frame.f_code.co_filename, caller_frame.f_lineno, message, None, None)
+        self.logger.handle(record)
+
+    def get_statistics(self):
+        return {"queued_records": self.record_queue.qsize(),
+                "dropped_records": self.queue_handler.dropped_records}
+
+    def stop(self):
+        self.record_queue.put(None)
+        self.thread.join()
+        self.logger.removeHandler(self.queue_handler)
+        self.file_handler.close()
+
+    def __write_records(self):
+        while True:
+            record = self.record_queue.get()
+            if record is None:
+                break
+            try:
+                self.file_handler.handle(record)
+            except Exception:
+                self.file_handler.handleError(record)
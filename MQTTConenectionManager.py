@@ -1,130 +1,572 @@
 # -*- coding: utf-8 -*-
+import fnmatch
 import paho.mqtt.client as mqtt
-import xml.etree.ElementTree as ET
 import ssl  # Sicherstellen, dass `ssl` importiert ist
+import threading
+import time
+import traceback
+from collections import deque, OrderedDict
+from Configuration import load_configuration
+from SubscriptionPlanner import SubscriptionPlanner
+from TopicIndex import HANDLER_WINDOW
+from Tracing import NULL_TRACER
+from TrafficRecorder import TrafficRecorder
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Spuren für eingehende Nachrichten: verworfen (Filter), bevorzugt (Fenster) oder Massendaten
+LANE_FILTERED = "filtered"
+LANE_PRIORITY = "priority"
+LANE_BULK = "bulk"
+
+class PublishBatch(object):
+    """
+    Gemeinsam verschickte Nachrichten einer Gruppe. wait() wartet einmal auf die
+    Bestätigung (on_publish) aller Nachrichten, duration ist die Zeit bis zur letzten Bestätigung.
+    """
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.started = time.time()
+        self.finished = None
+        self.published = 0
+        self.skipped = 0
+        self.failed = 0
+        self.outstanding = 0
+        self.sealed = False
+
+    def add(self):
+        with self.condition:
+            self.published += 1
+            self.outstanding += 1
+
+    def acknowledge(self):
+        with self.condition:
+            self.outstanding -= 1
+            self.__check_finished()
+
+    def skip(self):
+        # Nicht verschickt, weil das Gerät den Zielzustand bereits meldet
+        with self.condition:
+            self.skipped += 1
+
+    def supersede(self):
+        # Bereits gezählte Nachricht, die in der Offline-Queue durch eine neuere ersetzt wurde
+        with self.condition:
+            self.skipped += 1
+            self.outstanding -= 1
+            self.__check_finished()
+
+    def fail(self):
+        # Bereits gezählte Nachricht, die nicht zugestellt werden konnte
+        with self.condition:
+            self.failed += 1
+            self.outstanding -= 1
+            self.__check_finished()
+
+    def seal(self):
+        with self.condition:
+            self.sealed = True
+            self.__check_finished()
+
+    def __check_finished(self):
+        if self.sealed and self.outstanding == 0 and self.finished is None:
+            self.finished = time.time()
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            while self.finished is None:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    @property
+    def duration(self):
+        if self.finished is None:
+            return None
+        return self.finished - self.started
 
 class MQTTConnectionManager:
-    def __init__(self, delegate):
+    def __init__(self, delegate, configuration=None, state_cache=None, tracer=NULL_TRACER, subscriptions=None):
         self.delegate = delegate
+        self.state_cache = state_cache
+        self.tracer = tracer
+        self.skipped_publishes = 0
 
-        config_file_path = "config/config.xml"
-        root = ET.parse(config_file_path).getroot()
+        if configuration is None:
+            configuration = load_configuration()
+        system = configuration.system
 
-        self.broker_transport = root.find('MQTT_BROKER_TRANSPORT').text
-        self.broker_ip = root.find('MQTT_BROKER_IP').text
-        self.broker_port = int(root.find('MQTT_BROKER_PORT').text)
-        self.client_id = root.find('MQTT_CLIENT_ID').text
-        self.tls_path = root.find('MQTT_BROKER_IP').text
-        # self.tls_version = int(root.find('MQTT_TLS_VERSION').text)
+        self.broker_transport = system.mqtt_broker_transport
+        self.broker_ip = system.mqtt_broker_ip
+        self.broker_port = system.mqtt_broker_port
+        self.client_id = system.mqtt_client_id
+        self.tls_path = system.mqtt_tls_path
 
-        tls_version_str = root.find('MQTT_TLS_VERSION').text
-        if tls_version_str == "1.2":
+        if system.mqtt_tls_version == "1.2":
             self.tls_version = ssl.PROTOCOL_TLSv1_2
-        elif tls_version_str == "1.3":
+        elif system.mqtt_tls_version == "1.3":
             self.tls_version = ssl.PROTOCOL_TLSv1_3
         else:
-            raise ValueError("Unsupported TLS version specified in config: " + tls_version_str)
+            self.tls_version = None
 
-        self.broker_user = root.find('MQTT_BROKER_USER').text
-        self.broker_password = root.find('MQTT_BROKER_PASSWORD').text
-        self.broker_qos = int(root.find('MQTT_BROKER_QOS').text)
-        self.retain = self.__stringToBoolean(root.find('MQTT_RETAIN').text)
-        self.broker_async = self.__stringToBoolean(root.find('MQTT_BROKER_ASYNC').text)
+        self.broker_user = system.mqtt_broker_user
+        self.broker_password = system.mqtt_broker_password
+        self.broker_qos = system.mqtt_broker_qos
+        self.retain = system.mqtt_retain
 
-        self.auth = None
+        # Verbindungsaufbau mit exponentiellem Backoff im Netzwerk-Thread von paho
+        self.reconnect_min_delay = system.mqtt_reconnect_min_delay
+        self.reconnect_max_delay = system.mqtt_reconnect_max_delay
+        self.connected = False
+        self.offline_since = time.time()
+        self.reconnect_times = deque(maxlen=100)
+        self.connect_failures = 0
+        self.connections = 0
 
-        self.topic_publish_base = root.find('MQTT_PUBLISH_TOPIC_BASE').text
-        self.topic_subscribe_base = root.find('MQTT_SUBSCRIBE_TOPIC_BASE').text
+        # Befehle ohne Verbindung: je Topic nur der letzte, begrenzt und mit Ablaufzeit
+        self.offline_queue_size = system.mqtt_offline_queue_size
+        self.offline_ttl = system.mqtt_offline_ttl
+        self.offline_lock = threading.Lock()
+        self.offline_queue = OrderedDict()
+        self.offline_latencies = deque(maxlen=100)
+        self.offline_queued = 0
+        self.offline_expired = 0
+        self.offline_dropped = 0
+        self.offline_superseded = 0
 
-        if self.broker_qos not in range(0, 3):
-            self.broker_qos = 0
+        self.topic_publish_base = system.mqtt_publish_topic_base
+        self.topic_subscribe_base = system.mqtt_subscribe_topic_base
 
-        if self.broker_user is not None:
-            if self.broker_password is not None:
-                self.auth = {'username': self.broker_user,
-                             'password': self.broker_password}
-            else:
-                self.auth = {'username': self.broker_user,
-                             'password': ""}
-        else:
-            self.auth = None
+        # Übergabe eingehender Nachrichten an einen Worker-Pool, damit der Netzwerk-Thread nie auf NAOqi wartet
+        self.dispatch_queue_size = system.mqtt_dispatch_queue_size
+        self.dispatch_workers = system.mqtt_dispatch_workers
 
-        if self.broker_user == "" or self.broker_user == None:
-            self.auth = None
+        # Schutz vor Nachrichtenfluten: Allow-/Deny-Filter auf den Item-Namen und Token-Bucket je Topic
+        self.topic_index = configuration.topics.index
+        self.topic_allow = system.mqtt_topic_allow
+        self.topic_deny = system.mqtt_topic_deny
+        self.rate_limit = system.mqtt_rate_limit
+        self.rate_burst = system.mqtt_rate_burst
+        self.topic_lanes = {}
+        self.buckets = {}
+        # Gedrosselte Zustände: je Topic nur der neueste, weitergegeben sobald der Bucket wieder ein Token hat
+        self.throttle_condition = threading.Condition()
+        self.deferred = OrderedDict()
 
-        tls_version_str = root.find('MQTT_TLS_VERSION').text
-        if tls_version_str is None:
-           self.tls_version = None
-        elif tls_version_str == "1.2":
-            self.tls_version = ssl.PROTOCOL_TLSv1_2
-        elif tls_version_str == "1.3":
-            self.tls_version = ssl.PROTOCOL_TLSv1_3
-        else:
-            self.tls_version = None
+        # Optional alle eingehenden Nachrichten für spätere Lasttests aufzeichnen
+        self.recorder = None
+        if system.traffic_record_file is not None:
+            self.recorder = TrafficRecorder(system.traffic_record_file, system.traffic_record_queue_size)
+
+        # Items der aktiven Szenen abonnieren, mit MQTT_MIRROR_ITEMS zusätzlich alle Items der mqtt_topics.xml,
+        # die nach ALMemory gespiegelt werden (MQTT_SUBSCRIBE_ALL: wie ursprünglich "#")
+        self.planner = SubscriptionPlanner(self.topic_subscribe_base,
+                                           configuration.topics.subscriptions if subscriptions is None else subscriptions,
+                                           configuration.app.enabled_functions,
+                                           system.mqtt_subscribe_all,
+                                           configuration.topics.items.values() if system.mqtt_mirror_items else ())
+
+        self.auth = None
+        if self.broker_user is not None:
+            self.auth = {'username': self.broker_user,
+                         'password': self.broker_password or ""}
 
         self.broker_tls = None
-        if self.broker_port != 1883:
-            if self.tls_path is not None or self.tls_path != "":
-                if self.tls_version is not None or self.tls_version != "":
-                    self.broker_tls = (self.tls_path, self.tls_version)
-                else:
-                    self.broker_tls = self.tls_path
-            else:
-                self.broker_tls = None
+        if self.broker_port != 1883 and self.tls_path is not None:
+            self.broker_tls = (self.tls_path, self.tls_version)
 
-        self.client = mqtt.Client(self.client_id, clean_session=True, userdata=None, protocol=mqtt.MQTTv311, transport=self.broker_transport)        
+        if system.simulation:
+            # Simulationsmodus: In-Process-Broker statt echter Verbindung
+            from Simulation import SimulatedBroker, SimulatedMQTTClient
+            self.client = SimulatedMQTTClient(self.client_id, clean_session=True, userdata=None, protocol=mqtt.MQTTv311, transport=self.broker_transport, broker=SimulatedBroker.default(system))
+        else:
+            self.client = mqtt.Client(self.client_id, clean_session=True, userdata=None, protocol=mqtt.MQTTv311, transport=self.broker_transport)
 
         if self.broker_tls is not None:
-            self.client.tls_set(self.broker_tls)
+            if self.tls_version is not None:
+                self.client.tls_set(ca_certs=self.tls_path, tls_version=self.tls_version)
+            else:
+                self.client.tls_set(ca_certs=self.tls_path)
+
+        if self.auth is not None:
+            self.client.username_pw_set(self.auth['username'], self.auth['password'])
 
         self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
+        self.client.on_connect_fail = self.on_connect_fail
         self.client.on_message = self.on_message
-        self.client.username_pw_set(self.auth)
-        
-        # Jetzt können Sie die Verbindung zum Broker herstellen
-        if self.broker_async:
-            self.client.connect_async(self.broker_ip, self.broker_port)
-        else:
-            self.client.connect(self.broker_ip, self.broker_port)
+        self.client.on_publish = self.on_publish
 
-    def __stringToBoolean(self, string):
-        if string.lower() == "true":
-            return True
-        else:
-            return False
+        # Zuordnung mid -> PublishBatch (None für Einzel-Publishes); Bestätigungen, die vor der
+        # Registrierung der mid eintreffen, landen in early_acks
+        self.ack_lock = threading.Lock()
+        self.pending_acks = {}
+        self.early_acks = set()
+        self.publish_topics = {}
+        self.batch_durations = deque(maxlen=100)
+        self.failed_publishes = 0
+
+        # Je Worker eine eigene begrenzte Queue; ein Topic landet immer beim selben Worker,
+        # damit die Reihenfolge der Zustände pro Topic erhalten bleibt
+        self.dropped_messages = 0
+        self.dropped_priority_messages = 0
+        self.filtered_messages = 0
+        self.throttled_messages = 0
+        self.deferred_messages = 0
+        self.dispatch_queues = [queue.Queue(self.dispatch_queue_size) for _ in range(self.dispatch_workers)]
+        # Eigene Spur für Fensterereignisse, damit sie nie hinter Telemetrie warten
+        self.priority_queue = queue.Queue(self.dispatch_queue_size)
+        self.dispatched_messages = [0] * (self.dispatch_workers + 1)
+        self.worker_threads = []
+        for index, dispatch_queue in enumerate(self.dispatch_queues + [self.priority_queue]):
+            name = "MQTTDispatch-priority" if dispatch_queue is self.priority_queue else "MQTTDispatch-" + str(index)
+            worker = threading.Thread(target=self.__dispatch_worker, args=(index, dispatch_queue), name=name)
+            worker.daemon = True
+            worker.start()
+            self.worker_threads.append(worker)
+
+        self.running = True
+        self.throttle_thread = None
+        if self.rate_limit > 0:
+            self.throttle_thread = threading.Thread(target=self.__throttle_worker, name="MQTTThrottle")
+            self.throttle_thread.daemon = True
+            self.throttle_thread.start()
+
+        # paho verbindet im eigenen Netzwerk-Thread (loop_start) und wiederholt den Verbindungsaufbau
+        # mit exponentiellem Backoff; ein langsamer Broker blockiert den Start nicht. Nur dieser Thread
+        # schreibt auf den Socket, publish() aus Szenen-Threads legt die Pakete lediglich in die Queue
+        self.client.reconnect_delay_set(self.reconnect_min_delay, self.reconnect_max_delay)
+        self.client.connect_async(self.broker_ip, self.broker_port)
+        self.client.loop_start()
+
+    def __set_offline(self):
+        with self.offline_lock:
+            self.connected = False
+            if self.offline_since is None:
+                self.offline_since = time.time()
+
+    def on_disconnect(self, client, userdata, rc):
+        self.__set_offline()
+        if rc != 0:
+            print("Verbindung zum MQTT-Broker verloren. Rückgabewert:", rc)
+
+    def on_connect_fail(self, client, userdata):
+        # Broker nicht erreichbar; paho versucht es nach reconnect_delay_set erneut
+        self.connect_failures += 1
+        print("Verbindung zum MQTT-Broker nicht möglich")
+
+    def __flush_offline_queue(self):
+        # Läuft in on_connect; connected wird erst nach dem Leeren gesetzt, damit neue Befehle
+        # nicht vor älteren aus der Queue beim Broker ankommen
+        with self.offline_lock:
+            now = time.time()
+            queued = list(self.offline_queue.values())
+            self.offline_queue.clear()
+            for topic, payload, queued_at, batch in queued:
+                if now - queued_at > self.offline_ttl:
+                    self.offline_expired += 1
+                    if batch is not None:
+                        batch.fail()
+                    continue
+                self.offline_latencies.append(now - queued_at)
+                info = self.client.publish(topic, payload, self.broker_qos, retain=self.retain)
+                self.__track(info, batch)
+            self.connected = True
+            if self.offline_since is not None:
+                self.reconnect_times.append(now - self.offline_since)
+                self.offline_since = None
+
+    def __enqueue_offline(self, topic, payload, batch):
+        # Aufruf mit gehaltenem offline_lock
+        previous = self.offline_queue.pop(topic, None)
+        if previous is not None:
+            self.offline_superseded += 1
+            if previous[3] is not None:
+                previous[3].supersede()
+        elif len(self.offline_queue) >= self.offline_queue_size:
+            _, oldest = self.offline_queue.popitem(last=False)
+            self.offline_dropped += 1
+            if oldest[3] is not None:
+                oldest[3].fail()
+        self.offline_queue[topic] = (topic, payload, time.time(), batch)
+        self.offline_queued += 1
 
     def on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             print("Verbunden mit dem MQTT-Broker. Verbindungsergebniscode:", rc)
-            # Fügen Sie hier weitere Aktionen nach erfolgreicher Verbindung hinzu
-            # Zum Beispiel können Sie sich zu bestimmten Topics subscriben
-            self.client.subscribe(self.topic_subscribe_base + "#", self.broker_qos)
+            self.connections += 1
+            # Bei erhaltener Session kennt der Broker die Abonnements noch
+            if not flags.get("session present"):
+                # Alle geplanten Topics in einem einzigen SUBSCRIBE-Paket
+                self.__subscribe_topics(self.planner.topics())
+            self.__flush_offline_queue()
         else:
             print("Verbindung zum MQTT-Broker fehlgeschlagen. Rückgabewert:", rc)
 
     def on_message(self, client, userdata, msg):
-        print("Message Arrived: " + msg.topic + " payload: " + msg.payload.decode())
-        self.delegate.on_subscription(msg.topic, msg.payload.decode())
+        with self.tracer.span("on_message", "mqtt"):
+            topic = msg.topic
+            if self.recorder is not None:
+                self.recorder.record(topic, msg.payload)
+            lane = self.topic_lanes.get(topic)
+            if lane is None:
+                lane = self.topic_lanes[topic] = self.__classify(topic)
+            if lane is LANE_FILTERED:
+                self.filtered_messages += 1
+                return
+
+            payload = msg.payload.decode()
+            if self.state_cache is not None and topic.startswith(self.topic_subscribe_base):
+                self.state_cache.update(topic[len(self.topic_subscribe_base):], payload)
+
+            if lane is LANE_PRIORITY:
+                try:
+                    self.priority_queue.put_nowait((topic, payload))
+                except queue.Full:
+                    self.dropped_priority_messages += 1
+                return
+
+            # Der Zustand landet trotzdem im StateCache, nur die Weitergabe an NAOqi wird gedrosselt
+            if self.rate_limit > 0:
+                self.__dispatch_throttled(topic, payload)
+            else:
+                self.__dispatch(topic, payload)
+
+    def __dispatch(self, topic, payload):
+        dispatch_queue = self.dispatch_queues[hash(topic) % self.dispatch_workers]
+        try:
+            dispatch_queue.put_nowait((topic, payload))
+        except queue.Full:
+            self.dropped_messages += 1
+
+    def __dispatch_throttled(self, topic, payload):
+        with self.throttle_condition:
+            if topic in self.deferred:
+                # Ein wartender älterer Zustand wird durch den neuesten ersetzt und nie weitergegeben
+                self.deferred[topic] = payload
+                self.throttled_messages += 1
+            elif self.__take_token(topic):
+                self.__dispatch(topic, payload)
+            else:
+                self.deferred[topic] = payload
+                self.deferred_messages += 1
+                self.throttle_condition.notify()
+
+    def __classify(self, topic):
+        item = topic[len(self.topic_subscribe_base):] if topic.startswith(self.topic_subscribe_base) else topic
+        for pattern in self.topic_deny:
+            if fnmatch.fnmatchcase(item, pattern):
+                return LANE_FILTERED
+        if self.topic_allow and not any(fnmatch.fnmatchcase(item, pattern) for pattern in self.topic_allow):
+            return LANE_FILTERED
+        route = self.topic_index.lookup(topic)
+        if route is not None and route.handler == HANDLER_WINDOW:
+            return LANE_PRIORITY
+        return LANE_BULK
+
+    def __take_token(self, topic):
+        # Token-Bucket je Topic; Aufruf mit gehaltener throttle_condition
+        now = time.time()
+        bucket = self.buckets.get(topic)
+        if bucket is None:
+            bucket = self.buckets[topic] = [float(self.rate_burst), now]
+        else:
+            bucket[0] = min(float(self.rate_burst), bucket[0] + (now - bucket[1]) * self.rate_limit)
+            bucket[1] = now
+        if bucket[0] < 1.0:
+            return False
+        bucket[0] -= 1.0
+        return True
+
+    def __throttle_worker(self):
+        # Gibt zurückgehaltene Zustände weiter, sobald ihr Topic wieder ein Token hat; die Weitergabe
+        # erfolgt unter der Condition, damit kein neuerer Zustand desselben Topics überholt
+        with self.throttle_condition:
+            while self.running:
+                timeout = None
+                for topic in list(self.deferred):
+                    if self.__take_token(topic):
+                        self.__dispatch(topic, self.deferred.pop(topic))
+                    else:
+                        wait = (1.0 - self.buckets[topic][0]) / self.rate_limit
+                        timeout = wait if timeout is None else min(timeout, wait)
+                self.throttle_condition.wait(timeout)
+
+    def __dispatch_worker(self, index, dispatch_queue):
+        while True:
+            message = dispatch_queue.get()
+            if message is None:
+                break
+            try:
+                self.delegate.on_subscription(message[0], message[1])
+            except Exception:
+                traceback.print_exc()
+            self.dispatched_messages[index] += 1
+
+    def queue_depth(self):
+        return sum(dispatch_queue.qsize() for dispatch_queue in self.dispatch_queues) + self.priority_queue.qsize()
+
+    def rejected_messages(self):
+        """
+        Anzahl der Nachrichten, die nicht an on_subscription weitergegeben wurden.
+        """
+        return self.dropped_messages + self.dropped_priority_messages + self.filtered_messages + self.throttled_messages
 
-    def publish_to_item(self, item, payload):
-        topic = self.topic_publish_base + str(item)
-        self.client.publish(topic, payload, self.broker_qos, retain=self.retain)
+    def get_statistics(self):
+        return {"queue_depth": self.queue_depth(),
+                "dropped_messages": self.dropped_messages,
+                "dropped_priority_messages": self.dropped_priority_messages,
+                "filtered_messages": self.filtered_messages,
+                "throttled_messages": self.throttled_messages,
+                "deferred_messages": self.deferred_messages,
+                "deferred_depth": len(self.deferred),
+                "dispatched_messages": sum(self.dispatched_messages),
+                "skipped_publishes": self.skipped_publishes,
+                "failed_publishes": self.failed_publishes,
+                "pending_acks": len(self.pending_acks),
+                "connected": self.connected,
+                "connections": self.connections,
+                "connect_failures": self.connect_failures,
+                "mean_reconnect": sum(self.reconnect_times) / len(self.reconnect_times) if self.reconnect_times else 0.0,
+                "max_reconnect": max(self.reconnect_times) if self.reconnect_times else 0.0,
+                "offline_queue_depth": len(self.offline_queue),
+                "offline_queued": self.offline_queued,
+                "offline_expired": self.offline_expired,
+                "offline_dropped": self.offline_dropped,
+                "offline_superseded": self.offline_superseded,
+                "mean_offline_latency": sum(self.offline_latencies) / len(self.offline_latencies) if self.offline_latencies else 0.0,
+                "max_offline_latency": max(self.offline_latencies) if self.offline_latencies else 0.0,
+                "mean_batch_ack": sum(self.batch_durations) / len(self.batch_durations) if self.batch_durations else 0.0}
+
+    def publish_to_item(self, item, payload, force=False):
+        return self.__publish(item, payload, force, None)
+
+    def publish_batch(self, messages, force=False, ack_timeout=None):
+        """
+        Verschickt alle (Item, Payload)- bzw. (Item, Payload, force)-Tupel direkt hintereinander, ohne
+        zwischendurch auf den Broker zu warten. Mit ack_timeout wird anschließend einmal auf die Bestätigung
+        aller Nachrichten gewartet. Liefert den PublishBatch mit Zählern und der Dauer bis zur letzten Bestätigung.
+        """
+        batch = PublishBatch()
+        with self.tracer.span("publish_batch", "mqtt"):
+            for message in messages:
+                self.__publish(message[0], message[1], message[2] if len(message) > 2 else force, batch)
+            batch.seal()
+            if ack_timeout is not None and batch.wait(ack_timeout):
+                self.batch_durations.append(batch.duration)
+        return batch
+
+    def publish_group(self, members, payload=None, ack_timeout=None):
+        """
+        Schaltet eine Gerätegruppe aus der mqtt_topics.xml. Mitglieder ohne eigenen Payload erhalten payload.
+        """
+        return self.publish_batch([(member.item, member.payload if member.payload is not None else payload, member.force)
+                                   for member in members], ack_timeout=ack_timeout)
+
+    def __publish(self, item, payload, force, batch):
+        item = str(item)
+        # Nicht senden, wenn das Gerät den Zielzustand bereits meldet
+        if not force and self.state_cache is not None and self.state_cache.is_current(item, payload):
+            self.skipped_publishes += 1
+            if batch is not None:
+                batch.skip()
+            return False
+
+        topic = self.publish_topics.get(item)
+        if topic is None:
+            topic = self.publish_topics[item] = self.topic_publish_base + item
+
+        if batch is not None:
+            batch.add()
+
+        with self.offline_lock:
+            if not self.connected:
+                # Ohne Verbindung in die Offline-Queue; sie wird beim nächsten Verbinden geleert
+                self.__enqueue_offline(topic, payload, batch)
+                return True
+
+        with self.tracer.span("publish", "mqtt", {"item": item, "payload": str(payload)} if self.tracer.enabled else None):
+            info = self.client.publish(topic, payload, self.broker_qos, retain=self.retain)
+
+        if info.rc == mqtt.MQTT_ERR_NO_CONN and self.broker_qos == 0:
+            # Verbindung zwischen Prüfung und Versand verloren; paho würde die Nachricht verwerfen
+            with self.offline_lock:
+                self.__enqueue_offline(topic, payload, batch)
+            return True
+        if info.rc != mqtt.MQTT_ERR_SUCCESS and self.broker_qos == 0:
+            self.failed_publishes += 1
+            if batch is not None:
+                batch.fail()
+            return False
+
+        self.__track(info, batch)
+        return True
+
+    def __track(self, info, batch):
+        with self.ack_lock:
+            acknowledged = info.mid in self.early_acks
+            if acknowledged:
+                self.early_acks.discard(info.mid)
+            else:
+                self.pending_acks[info.mid] = batch
+        if acknowledged and batch is not None:
+            batch.acknowledge()
+
+    def on_publish(self, client, userdata, mid):
+        # Läuft im Netzwerk-Thread von loop_start; paho hält dabei eigene Locks, daher hier nie publish() aufrufen
+        with self.ack_lock:
+            if mid not in self.pending_acks:
+                self.early_acks.add(mid)
+                return
+            batch = self.pending_acks.pop(mid)
+        if batch is not None:
+            batch.acknowledge()
 
     def subscribe_to_item(self, item):
-        topic = self.topic_subscribe_base + str(item)
-        self.client.subscribe(topic, self.broker_qos)
+        self.subscribe_to_items([item])
 
     def subscribe_to_items(self, items):
-        for item in items:
-            self.subscribe_to_item(item)
+        self.__subscribe_topics([self.topic_subscribe_base + str(item) for item in items])
 
     def unsubscribe_of_item(self, item):
-        topic = self.topic_subscribe_base + str(item)
-        self.client.unsubscribe(topic)
+        self.unsubscribe_of_items([item])
 
     def unsubscribe_of_items(self, items):
-        for item in items:
-            self.unsubscribe_of_item(item)
+        self.__unsubscribe_topics([self.topic_subscribe_base + str(item) for item in items])
+
+    def set_scene_enabled(self, scene, enabled):
+        """
+        Passt die Abonnements an, wenn eine Szene ein- oder ausgeschaltet wird; verschickt nur die Differenz.
+        """
+        subscribe, unsubscribe = self.planner.set_scene_enabled(scene, enabled)
+        self.__subscribe_topics(subscribe)
+        self.__unsubscribe_topics(unsubscribe)
+        return subscribe, unsubscribe
+
+    def __subscribe_topics(self, topics):
+        if topics:
+            self.client.subscribe([(topic, self.broker_qos) for topic in topics])
+
+    def __unsubscribe_topics(self, topics):
+        if topics:
+            self.client.unsubscribe(list(topics))
 
     def disconnect(self):
+        self.running = False
+        with self.throttle_condition:
+            self.throttle_condition.notify()
+        if self.throttle_thread is not None:
+            self.throttle_thread.join()
         self.client.disconnect()
+        self.client.loop_stop()
+        for dispatch_queue in self.dispatch_queues + [self.priority_queue]:
+            dispatch_queue.put(None)
+        if self.recorder is not None:
+            self.recorder.stop()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+import threading
+import traceback
+from collections import OrderedDict
+
+class MemoryWriter(object):
+    """
+    Write-Behind-Stufe vor ALMemory: Mehrfache Updates desselben Keys innerhalb eines
+    Flush-Intervalls werden zusammengefasst und gesammelt per insertListData geschrieben.
+    """
+    def __init__(self, memory, flush_interval, max_batch_size, synchronous=False, on_error=None):
+        self.memory = memory
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.synchronous = synchronous
+        self.on_error = on_error
+
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.running = not synchronous
+
+        self.coalesced_updates = 0
+        self.written_updates = 0
+        self.flushed_batches = 0
+
+        self.thread = None
+        if not self.synchronous:
+            self.thread = threading.Thread(target=self.__run, name="MemoryWriter")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def insert(self, key, value):
+        if self.synchronous:
+            self.memory.insert_data(key, value)
+            self.written_updates += 1
+            return
+
+        with self.condition:
+            if key in self.pending:
+                # Nur der letzte Wert eines Keys wird geschrieben
+                del self.pending[key]
+                self.coalesced_updates += 1
+            self.pending[key] = value
+            if len(self.pending) >= self.max_batch_size:
+                self.condition.notify()
+
+    def flush(self):
+        with self.condition:
+            batch = self.pending
+            self.pending = OrderedDict()
+        self.__write(batch)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    def get_statistics(self):
+        return {"pending_updates": len(self.pending),
+                "coalesced_updates": self.coalesced_updates,
+                "written_updates": self.written_updates,
+                "flushed_batches": self.flushed_batches}
+
+    def __run(self):
+        while True:
+            with self.condition:
+                if self.running and len(self.pending) < self.max_batch_size:
+                    self.condition.wait(self.flush_interval)
+                if not self.running:
+                    break
+                batch = self.pending
+                self.pending = OrderedDict()
+            self.__write(batch)
+
+    def __write(self, batch):
+        if not batch:
+            return
+        items = [[key, value] for key, value in batch.items()]
+        for start in range(0, len(items), self.max_batch_size):
+            chunk = items[start:start + self.max_batch_size]
+            try:
+                self.memory.insertListData(chunk)
+                self.written_updates += len(chunk)
+                self.flushed_batches += 1
+            except Exception:
+                if self.on_error is not None:
+                    self.on_error(traceback.format_exc())
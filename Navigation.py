@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import math
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+# trajectory: ein moveTo mit allen Kontrollpunkten je Abschnitt; chain: Einzelbewegungen als Kette von qi-Futures
+ROUTE_MODES = ("trajectory", "chain")
+
+# Wegpunkt relativ zur Pose nach dem vorherigen Wegpunkt (Meter, Meter, Radiant)
+Waypoint = namedtuple("Waypoint", ["x", "y", "theta"])
+
+# Abschnitt einer kompilierten Route: Posen für einen einzigen moveTo-Aufruf oder ein Synchronisationspunkt
+RouteSegment = namedtuple("RouteSegment", ["poses", "cue"])
+
+# steps enthält Waypoints und Namen von Synchronisationspunkten in der Reihenfolge aus der app.xml
+Route = namedtuple("Route", ["name", "mode", "steps", "segments"])
+
+def compile_route(name, mode, steps):
+    """
+    Fasst aufeinanderfolgende Wegpunkte zu Abschnitten zusammen, die jeweils mit einem einzigen
+    moveTo gefahren werden. Die Kontrollpunkte eines Abschnitts liegen im Roboter-Koordinatensystem
+    zu Beginn des Abschnitts; Synchronisationspunkte trennen die Abschnitte.
+    """
+    if mode not in ROUTE_MODES:
+        raise ValueError("Unknown route mode '{}' for route {}".format(mode, name))
+
+    segments = []
+    poses = []
+    x = y = theta = 0.0
+    for step in steps:
+        if isinstance(step, Waypoint):
+            x += step.x * math.cos(theta) - step.y * math.sin(theta)
+            y += step.x * math.sin(theta) + step.y * math.cos(theta)
+            theta += step.theta
+            poses.append((x, y, theta))
+        else:
+            if poses:
+                segments.append(RouteSegment(tuple(poses), None))
+                poses = []
+                x = y = theta = 0.0
+            segments.append(RouteSegment((), step))
+    if poses:
+        segments.append(RouteSegment(tuple(poses), None))
+    return Route(name, mode, tuple(steps), tuple(segments))
+
+class RouteRunner(object):
+    """
+    Fährt kompilierte Routen mit ALMotion ab und meldet Synchronisationspunkte über on_cue,
+    z.B. an eine Timeline, damit Sprache und Geräte parallel zur Bewegung laufen.
+    """
+    def __init__(self, motion):
+        self.motion = motion
+
+    def run(self, route, on_cue=None):
+        """
+        Fährt die Route und liefert die Dauer in Sekunden.
+        """
+        start = time.time()
+        if route.mode == "chain":
+            self.__run_chain(route, on_cue)
+        else:
+            for segment in route.segments:
+                if segment.cue is not None:
+                    if on_cue is not None:
+                        on_cue(segment.cue)
+                elif len(segment.poses) == 1:
+                    self.motion.moveTo(*segment.poses[0])
+                else:
+                    self.motion.moveTo([list(pose) for pose in segment.poses])
+        return time.time() - start
+
+    def __run_chain(self, route, on_cue):
+        # Der nächste moveTo wird direkt im Callback des vorherigen abgeschickt
+        steps = route.steps
+        if not steps:
+            return
+
+        done = threading.Event()
+        state = {"error": None}
+
+        def issue(index):
+            while index < len(steps) and not isinstance(steps[index], Waypoint):
+                if on_cue is not None:
+                    on_cue(steps[index])
+                index += 1
+            if index == len(steps):
+                done.set()
+                return
+            waypoint = steps[index]
+            future = self.motion.moveTo(waypoint.x, waypoint.y, waypoint.theta, _async=True)
+            future.addCallback(lambda finished_future: finished(index, finished_future))
+
+        def finished(index, future):
+            if future.hasError():
+                state["error"] = future.error()
+                done.set()
+                return
+            try:
+                issue(index + 1)
+            except Exception:
+                state["error"] = traceback.format_exc()
+                done.set()
+
+        issue(0)
+        done.wait()
+        if state["error"] is not None:
+            raise RuntimeError("ALMotion.moveTo failed on route {}: {}".format(route.name, state["error"]))
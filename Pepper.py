@@ -1,32 +1,37 @@
 # -*- coding: utf-8 -*-
-import xml.etree.ElementTree as ET
 from BasicBehaviour import BasicBehaviour
-import qi
+from Configuration import load_configuration
 import sys
 
 class Pepper:
-    def __init__(self, application, session):
+    def __init__(self, application, session, configuration):
         self.application = application
         self.session = session
+        self.configuration = configuration
 
     def start(self):
         # BasicBehaviour mit der qi.Session-Instanz initialisieren und starten
-        basic_behaviour = BasicBehaviour(self.application, self.session)
+        basic_behaviour = BasicBehaviour(self.application, self.session, self.configuration)
         basic_behaviour.start()
 
 # Hauptprogramm
 if __name__ == "__main__":
     # Implementierung der Logik zum Laden der Konfigurationsdatei
-    config_file_path = "config/config.xml"
-    root = ET.parse(config_file_path).getroot()
+    configuration = load_configuration()
 
-    ROBOT_URL = root.find('ROBOT_URL').text
-    ROBOT_PORT = root.find('ROBOT_PORT').text
+    ROBOT_URL = configuration.system.robot_url
+    ROBOT_PORT = configuration.system.robot_port
 
-    app = qi.Application(["--qi-url=" + "tcp://" + ROBOT_URL + ":" + str(ROBOT_PORT)])
+    if configuration.system.simulation:
+        # Simulationsmodus: Pepper, Broker und Raspberry Pi werden im Prozess nachgebildet
+        from Simulation import SimulatedApplication
+        app = SimulatedApplication(configuration)
+    else:
+        import qi
+        app = qi.Application(["--qi-url=" + "tcp://" + ROBOT_URL + ":" + str(ROBOT_PORT)])
     app.start()
 
-    pepper = Pepper(app, app.session)
+    pepper = Pepper(app, app.session, configuration)
     pepper.start()
 
     app.run()
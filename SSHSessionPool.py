@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+import socket
+import threading
+import time
+import traceback
+from collections import deque
+import paramiko
+
+class RemoteProcess(object):
+    """
+    Auf dem entfernten Rechner laufender Befehl. Die Ausgabe wird nicht-blockierend in einem
+    eigenen Thread gelesen; stop() beendet den Prozess über das Pseudo-Terminal.
+    """
+    def __init__(self, channel, command, on_output=None, max_output=65536):
+        self.channel = channel
+        self.command = command
+        self.on_output = on_output
+        self.output = deque(maxlen=max_output)
+        self.started = time.time()
+        self.exit_status = None
+
+        self.thread = threading.Thread(target=self.__read_output, name="SSHOutput")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __read_output(self):
+        self.channel.settimeout(0.1)
+        while True:
+            try:
+                data = self.channel.recv(4096)
+            except socket.timeout:
+                if self.channel.exit_status_ready() and not self.channel.recv_ready():
+                    break
+                continue
+            except (paramiko.SSHException, IOError, EOFError):
+                break
+            if not data:
+                break
+            text = data.decode("utf-8", "replace")
+            self.output.extend(text)
+            if self.on_output is not None:
+                self.on_output(text)
+        if self.channel.exit_status_ready():
+            self.exit_status = self.channel.recv_exit_status()
+
+    def is_running(self):
+        return self.thread.is_alive()
+
+    def get_output(self):
+        return "".join(self.output)
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def stop(self):
+        try:
+            # Strg+C über das Pseudo-Terminal, danach den Kanal schließen (SIGHUP)
+            self.channel.send("\x03")
+        except (paramiko.SSHException, IOError, socket.error):
+            pass
+        self.channel.close()
+        self.thread.join(2)
+
+class SSHSessionPool(object):
+    """
+    Hält eine authentifizierte SSH-Verbindung samt vorab geöffnetem Kanal bereit, damit Befehle
+    ohne Verbindungsaufbau sofort gestartet werden können. Die Verbindung wird per Keepalive
+    gehalten; die Überwachung prüft sie alle check_interval Sekunden und baut sie bei Abbruch neu auf.
+    """
+    def __init__(self, host, port, user, password, keepalive_interval=30, reconnect_delay=5, check_interval=1, connect_timeout=5):
+        self.host = host
+        self.port = int(port)
+        self.user = user
+        self.password = password
+        self.keepalive_interval = keepalive_interval
+        self.reconnect_delay = reconnect_delay
+        self.check_interval = check_interval
+        self.connect_timeout = connect_timeout
+
+        self.client = None
+        self.spare_channel = None
+        self.lock = threading.RLock()
+        self.connected = threading.Event()
+        # Weckt die Überwachung vorzeitig, z.B. wenn execute keine Verbindung vorfindet
+        self.wakeup = threading.Event()
+        self.running = False
+        self.warmed_up = False
+        self.thread = None
+
+    def start(self):
+        """
+        Baut die Verbindung im Hintergrund auf und überwacht sie.
+        """
+        self.running = True
+        self.thread = threading.Thread(target=self.__monitor, name="SSHSessionPool")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def warm_up(self):
+        """
+        Baut die Verbindung sofort auf und startet danach die Überwachung.
+        Schlägt der erste Versuch fehl, übernimmt die Überwachung die weiteren Versuche.
+        Weitere Aufrufe, z.B. von mehreren Robotern mit gemeinsamem Pool, haben keine Wirkung.
+        """
+        with self.lock:
+            if self.warmed_up:
+                return
+            self.warmed_up = True
+        try:
+            self.connect()
+        except (paramiko.SSHException, IOError, socket.error) as e:
+            print(e)
+        self.start()
+
+    def connect(self):
+        with self.lock:
+            self.__close_client()
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            print("Establishing Connection...")
+            client.connect(self.host, self.port, self.user, self.password,
+                           timeout=self.connect_timeout, banner_timeout=self.connect_timeout, auth_timeout=self.connect_timeout)
+            client.get_transport().set_keepalive(self.keepalive_interval)
+            print("Connection established.")
+            self.client = client
+            self.spare_channel = self.__open_channel()
+            self.connected.set()
+
+    def is_active(self):
+        with self.lock:
+            return self.client is not None and self.client.get_transport() is not None and self.client.get_transport().is_active()
+
+    def execute(self, command, on_output=None):
+        """
+        Startet den Befehl auf dem vorab geöffneten Kanal und liefert einen RemoteProcess.
+        Ohne bestehende Verbindung wird nicht gewartet, sondern sofort SSHException ausgelöst.
+        """
+        if not self.connected.is_set() or not self.is_active():
+            self.wakeup.set()
+            raise paramiko.SSHException("SSH connection to " + self.host + " not available")
+        with self.lock:
+            channel = self.spare_channel
+            self.spare_channel = None
+            if channel is None or channel.closed:
+                channel = self.__open_channel()
+            channel.exec_command(command)
+            process = RemoteProcess(channel, command, on_output)
+
+        # Nächsten Kanal schon jetzt vorbereiten
+        spare_thread = threading.Thread(target=self.__prepare_spare_channel, name="SSHSpareChannel")
+        spare_thread.daemon = True
+        spare_thread.start()
+        return process
+
+    def close(self):
+        self.running = False
+        self.wakeup.set()
+        with self.lock:
+            self.__close_client()
+
+    def __open_channel(self):
+        channel = self.client.get_transport().open_session()
+        channel.get_pty()
+        return channel
+
+    def __prepare_spare_channel(self):
+        try:
+            with self.lock:
+                if self.spare_channel is None and self.is_active():
+                    self.spare_channel = self.__open_channel()
+        except (paramiko.SSHException, IOError):
+            traceback.print_exc()
+
+    def __close_client(self):
+        self.connected.clear()
+        if self.spare_channel is not None:
+            self.spare_channel.close()
+            self.spare_channel = None
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def __monitor(self):
+        while self.running:
+            if not self.is_active() and self.running:
+                try:
+                    self.connect()
+                except (paramiko.SSHException, IOError, socket.error) as e:
+                    print(e)
+                    time.sleep(self.reconnect_delay)
+                    continue
+            self.wakeup.wait(self.check_interval)
+            self.wakeup.clear()
@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+import errno
+import itertools
+import socket
+import threading
+import time
+import traceback
+from collections import deque
+import paho.mqtt.client as mqtt
+import paramiko
+from SpeechPipeline import parse_markup, ANIMATION_COMMANDS
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Zielposition der Rollläden in Prozent (0 = offen, 100 = geschlossen); STOP hält die Fahrt an
+SHUTTER_TARGETS = {"DOWN": 100, "UP": 0, "STOP": None}
+
+# Rollläden melden ihre Position während der Fahrt in diesen Schritten
+SHUTTER_STEP = 10
+
+def latencies_from_config(system):
+    """
+    Simulierte Latenzen je (Service, Methode); der Eintrag None gilt für alle übrigen Aufrufe.
+    """
+    return {
+        None: system.simulation_rpc_latency,
+        ("ALAnimatedSpeech", "say"): system.simulation_speech_latency,
+        ("ALTextToSpeech", "say"): system.simulation_speech_latency,
+        ("ALMotion", "moveTo"): system.simulation_motion_latency,
+        ("ALMotion", "wakeUp"): system.simulation_motion_latency,
+        ("ALMotion", "rest"): system.simulation_motion_latency,
+        ("ALAnimationPlayer", "run"): system.simulation_animation_latency,
+        ("ALBehaviorManager", "runBehavior"): system.simulation_animation_latency
+    }
+
+def installed_behaviors_from_texts(texts, behaviors=("Headbang", "WTF")):
+    installed = set(behaviors)
+    for lines in texts.values():
+        for line in lines.values():
+            for command, argument in parse_markup(line):
+                if command in ANIMATION_COMMANDS:
+                    installed.add(argument)
+    return sorted(installed)
+
+class SimulatedFuture(object):
+    """
+    Nachbildung von qi.Future für Aufrufe mit _async=True.
+    """
+    def __init__(self):
+        self.finished = threading.Event()
+        self.lock = threading.Lock()
+        self.callbacks = []
+        self.result = None
+        self.error_message = None
+
+    @staticmethod
+    def run_later(delay, function):
+        future = SimulatedFuture()
+
+        def complete():
+            try:
+                future.set_value(function())
+            except Exception:
+                future.set_error(traceback.format_exc())
+
+        timer = threading.Timer(delay, complete)
+        timer.daemon = True
+        timer.start()
+        return future
+
+    def set_value(self, value):
+        self.result = value
+        self.__finish()
+
+    def set_error(self, message):
+        self.error_message = message
+        self.__finish()
+
+    def __finish(self):
+        with self.lock:
+            self.finished.set()
+            callbacks = self.callbacks
+            self.callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+    def addCallback(self, callback):
+        with self.lock:
+            if not self.finished.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout=None):
+        self.finished.wait(timeout)
+
+    def isFinished(self):
+        return self.finished.is_set()
+
+    def hasError(self, timeout=None):
+        self.finished.wait(timeout)
+        return self.error_message is not None
+
+    def error(self, timeout=None):
+        self.finished.wait(timeout)
+        return self.error_message
+
+    def value(self, timeout=None):
+        self.finished.wait(timeout)
+        if self.error_message is not None:
+            raise RuntimeError(self.error_message)
+        return self.result
+
+class SimulatedService(object):
+    """
+    Stellvertreter für einen NAOqi-Service: Jeder Methodenaufruf dauert die konfigurierte Latenz
+    und wird protokolliert. ALMemory hält Daten und Events im Speicher.
+    """
+    def __init__(self, name, latencies, installed_behaviors, history_size=10000):
+        self.name = name
+        self.latencies = latencies
+        self.installed_behaviors = list(installed_behaviors)
+        self.calls = deque(maxlen=history_size)
+        self.data = {}
+        self.events = deque(maxlen=history_size)
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        latency = self.latencies.get((self.name, method), self.latencies[None])
+
+        def call(*args, **kwargs):
+            if kwargs.pop("_async", False):
+                return SimulatedFuture.run_later(latency, lambda: self.__handle(method, args))
+            if latency > 0:
+                time.sleep(latency)
+            return self.__handle(method, args)
+        return call
+
+    def __handle(self, method, args):
+        self.calls.append((time.time(), method))
+        if method == "insert_data" or method == "insertData":
+            self.data[args[0]] = args[1]
+        elif method == "insertListData":
+            for key, value in args[0]:
+                self.data[key] = value
+        elif method == "getData":
+            return self.data.get(args[0])
+        elif method == "raise_event" or method == "raiseEvent":
+            self.events.append((args[0], args[1]))
+        elif method == "getInstalledBehaviors":
+            return list(self.installed_behaviors)
+        elif method in ("preloadBehavior", "isBehaviorInstalled"):
+            return args[0] in self.installed_behaviors
+        return None
+
+class SimulatedSession(object):
+    def __init__(self, latencies, installed_behaviors=()):
+        self.latencies = latencies
+        self.installed_behaviors = installed_behaviors
+        self.services = {}
+        self.lock = threading.Lock()
+
+    def service(self, name):
+        with self.lock:
+            if name not in self.services:
+                self.services[name] = SimulatedService(name, self.latencies, self.installed_behaviors)
+            return self.services[name]
+
+class SimulatedApplication(object):
+    """
+    Ersatz für qi.Application ohne Roboter.
+    """
+    def __init__(self, configuration):
+        self.session = SimulatedSession(latencies_from_config(configuration.system),
+                                        installed_behaviors_from_texts(configuration.texts))
+        self.stopped = threading.Event()
+
+    def start(self):
+        pass
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.stopped.wait(0.5)
+
+    def stop(self):
+        self.stopped.set()
+
+class SimulatedMessage(object):
+    def __init__(self, topic, payload, qos=0, retain=False):
+        self.topic = topic
+        if not isinstance(payload, bytes):
+            payload = str(payload).encode("utf-8")
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+class SimulatedMessageInfo(object):
+    def __init__(self, mid, rc=0):
+        self.mid = mid
+        self.rc = rc
+
+    def is_published(self):
+        return self.rc == 0
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+class SimulatedBroker(object):
+    """
+    In-Process-Broker: verteilt Nachrichten an verbundene SimulatedMQTTClients und beantwortet
+    Befehle unter command_base nach device_latency mit einer Zustandsmeldung unter state_base.
+    Rollläden fahren in shutter_travel_time Sekunden ganz auf oder zu und melden unterwegs ihre Position.
+    """
+    default_broker = None
+    default_lock = threading.Lock()
+
+    def __init__(self, command_base, state_base, device_latency=0.05, shutter_travel_time=20.0):
+        self.command_base = command_base
+        self.state_base = state_base
+        self.device_latency = device_latency
+        self.shutter_travel_time = shutter_travel_time
+        self.clients = {}
+        self.retained = {}
+        self.lock = threading.Lock()
+        self.published_messages = 0
+        self.available = True
+        # Position und laufende Fahrt je Rollladen; eine neue Fahrt oder STOP beendet die vorherige
+        self.shutter_positions = {}
+        self.shutter_moves = {}
+
+    @classmethod
+    def default(cls, system):
+        with cls.default_lock:
+            if cls.default_broker is None:
+                cls.default_broker = SimulatedBroker(system.mqtt_publish_topic_base,
+                                                     system.mqtt_subscribe_topic_base,
+                                                     system.simulation_device_latency,
+                                                     system.simulation_shutter_travel_time)
+            return cls.default_broker
+
+    def attach(self, client):
+        with self.lock:
+            previous = self.clients.get(client.client_id)
+            self.clients[client.client_id] = client
+        # Wie ein echter Broker: gleiche Client-ID trennt die bestehende Verbindung
+        if previous is not None and previous is not client:
+            previous.dropped_by_broker()
+
+    def set_available(self, available):
+        """
+        Simuliert einen Ausfall des Brokers: Alle Clients verlieren die Verbindung, neue Verbindungen scheitern.
+        """
+        self.available = available
+        if not available:
+            with self.lock:
+                clients = list(self.clients.values())
+                self.clients.clear()
+            for client in clients:
+                client.dropped_by_broker(mqtt.MQTT_ERR_CONN_LOST)
+
+    def detach(self, client):
+        with self.lock:
+            if self.clients.get(client.client_id) is client:
+                del self.clients[client.client_id]
+
+    def subscribed(self, client, pattern):
+        for topic, message in list(self.retained.items()):
+            if mqtt.topic_matches_sub(pattern, topic):
+                client.deliver(message)
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        message = SimulatedMessage(topic, payload, qos, retain)
+        self.published_messages += 1
+        if retain:
+            self.retained[topic] = message
+        with self.lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            if client.is_subscribed(topic):
+                client.deliver(message)
+
+        if topic.startswith(self.command_base):
+            item = topic[len(self.command_base):]
+            command = message.payload.decode()
+            if command in SHUTTER_TARGETS:
+                self.__move_shutter(item, SHUTTER_TARGETS[command])
+            else:
+                self.__later(self.device_latency, self.publish, self.state_base + item, command)
+
+    def __later(self, delay, function, *args):
+        timer = threading.Timer(delay, function, args=args)
+        timer.daemon = True
+        timer.start()
+
+    def __move_shutter(self, item, target):
+        with self.lock:
+            move = self.shutter_moves.get(item, 0) + 1
+            self.shutter_moves[item] = move
+        if target is None:
+            # Angehalten: aktuelle Position melden
+            self.__later(self.device_latency, self.__shutter_step, item, None, move)
+        else:
+            self.__later(self.shutter_travel_time * SHUTTER_STEP / 100.0, self.__shutter_step, item, target, move)
+
+    def __shutter_step(self, item, target, move):
+        with self.lock:
+            if self.shutter_moves.get(item) != move:
+                return
+            position = self.shutter_positions.get(item, 0)
+            if target is not None and position != target:
+                position += SHUTTER_STEP if target > position else -SHUTTER_STEP
+                self.shutter_positions[item] = position
+        self.publish(self.state_base + item, str(position))
+        if target is not None and position != target:
+            self.__later(self.shutter_travel_time * SHUTTER_STEP / 100.0, self.__shutter_step, item, target, move)
+
+class SimulatedMQTTClient(object):
+    """
+    Nachbildung der verwendeten paho-Client-Schnittstelle gegen den SimulatedBroker.
+    Callbacks laufen wie bei paho im Thread, der loop() aufruft, bzw. im Thread von loop_start.
+    """
+    def __init__(self, client_id, clean_session=True, userdata=None, protocol=None, transport="tcp", broker=None):
+        self.client_id = client_id
+        self.userdata = userdata
+        self.broker = broker
+        self.subscriptions = {}
+        self.connected = False
+        self.inbox = queue.Queue()
+        self.mids = itertools.count(1)
+        self.thread = None
+        # Wie paho: nach einem Verbindungsverlust mit verdoppelter Wartezeit erneut verbinden
+        self.reconnect_min_delay = 1
+        self.reconnect_max_delay = 120
+        self.reconnect_delay = None
+        self.stopping = threading.Event()
+
+        self.on_connect = None
+        self.on_connect_fail = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.on_publish = None
+        self.on_subscribe = None
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def username_pw_set(self, username, password=None):
+        pass
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        self.reconnect_min_delay = min_delay
+        self.reconnect_max_delay = max_delay
+
+    def connect(self, host, port=1883, keepalive=60):
+        if not self.broker.available:
+            raise socket.error(errno.ECONNREFUSED, "Connection refused")
+        self.broker.attach(self)
+        self.connected = True
+        self.reconnect_delay = None
+        self.inbox.put(("connect", 0))
+        return 0
+
+    def connect_async(self, host, port=1883, keepalive=60):
+        self.host = host
+        self.port = port
+
+    def reconnect(self):
+        return self.connect(None)
+
+    def disconnect(self):
+        # Gewollte Trennung: der Thread von loop_start verbindet nicht erneut
+        self.stopping.set()
+        self.broker.detach(self)
+        if self.connected:
+            self.connected = False
+            self.inbox.put(("disconnect", 0))
+        return 0
+
+    def dropped_by_broker(self, rc=7):
+        self.connected = False
+        self.inbox.put(("disconnect", rc))
+
+    def is_connected(self):
+        return self.connected
+
+    def loop_start(self):
+        if self.thread is not None:
+            return
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.__loop, name="SimulatedMQTT-" + str(self.client_id))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def loop_stop(self, force=False):
+        if self.thread is not None:
+            self.stopping.set()
+            self.inbox.put(None)
+            if threading.current_thread() is not self.thread:
+                self.thread.join()
+            self.thread = None
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        mid = next(self.mids)
+        if not self.connected:
+            return SimulatedMessageInfo(mid, mqtt.MQTT_ERR_NO_CONN)
+        self.broker.publish(topic, payload, qos, retain)
+        # Wie paho: on_publish auch bei QoS 0, sobald die Nachricht verschickt ist
+        self.inbox.put(("publish", mid))
+        return SimulatedMessageInfo(mid)
+
+    def subscribe(self, topic, qos=0):
+        topics = topic if isinstance(topic, list) else [(topic, qos)]
+        for pattern, pattern_qos in topics:
+            self.subscriptions[pattern] = pattern_qos
+        mid = next(self.mids)
+        self.inbox.put(("subscribe", (mid, tuple(pattern_qos for _, pattern_qos in topics))))
+        for pattern, _ in topics:
+            self.broker.subscribed(self, pattern)
+        return (mqtt.MQTT_ERR_SUCCESS, mid)
+
+    def unsubscribe(self, topic):
+        topics = topic if isinstance(topic, list) else [topic]
+        for pattern in topics:
+            self.subscriptions.pop(pattern, None)
+        return (mqtt.MQTT_ERR_SUCCESS, next(self.mids))
+
+    def is_subscribed(self, topic):
+        for pattern in list(self.subscriptions):
+            if mqtt.topic_matches_sub(pattern, topic):
+                return True
+        return False
+
+    def deliver(self, message):
+        self.inbox.put(("message", message))
+
+    def loop(self, timeout=1.0):
+        """
+        Wie paho: verarbeitet anstehende Ereignisse im aufrufenden Thread und meldet den Verbindungszustand.
+        """
+        try:
+            event = self.inbox.get(timeout=timeout)
+            while event is not None:
+                self.__handle(event)
+                event = self.inbox.get_nowait()
+        except queue.Empty:
+            pass
+        return mqtt.MQTT_ERR_SUCCESS if self.connected else mqtt.MQTT_ERR_NO_CONN
+
+    def __loop(self):
+        # Wie paho loop_forever(retry_first_connection=True): Verbindungsaufbau, Ereignisse, Reconnect
+        attempted = False
+        while not self.stopping.is_set():
+            if not self.connected:
+                if attempted:
+                    self.__reconnect_wait()
+                    if self.stopping.is_set():
+                        break
+                attempted = True
+                try:
+                    self.connect(None)
+                except socket.error:
+                    self.__handle(("connect_fail", None))
+                    continue
+            event = self.inbox.get()
+            if event is None:
+                break
+            self.__handle(event)
+
+    def __reconnect_wait(self):
+        if self.reconnect_delay is None:
+            self.reconnect_delay = self.reconnect_min_delay
+        else:
+            self.reconnect_delay = min(self.reconnect_delay * 2, self.reconnect_max_delay)
+        self.stopping.wait(self.reconnect_delay)
+
+    def __handle(self, event):
+        kind, argument = event
+        try:
+            if kind == "connect" and self.on_connect is not None:
+                self.on_connect(self, self.userdata, {}, argument)
+            elif kind == "connect_fail" and self.on_connect_fail is not None:
+                self.on_connect_fail(self, self.userdata)
+            elif kind == "disconnect" and self.on_disconnect is not None:
+                self.on_disconnect(self, self.userdata, argument)
+            elif kind == "message" and self.on_message is not None:
+                self.on_message(self, self.userdata, argument)
+            elif kind == "publish" and self.on_publish is not None:
+                self.on_publish(self, self.userdata, argument)
+            elif kind == "subscribe" and self.on_subscribe is not None:
+                self.on_subscribe(self, self.userdata, argument[0], argument[1])
+        except Exception:
+            traceback.print_exc()
+
+class SimulatedRemoteProcess(object):
+    def __init__(self, command, duration):
+        self.command = command
+        self.started = time.time()
+        self.finished = threading.Event()
+        self.exit_status = None
+        self.timer = threading.Timer(duration, self.__exit, args=(0,))
+        self.timer.daemon = True
+        self.timer.start()
+
+    def __exit(self, status):
+        self.exit_status = status
+        self.finished.set()
+
+    def is_running(self):
+        return not self.finished.is_set()
+
+    def get_output(self):
+        return ""
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def stop(self):
+        self.timer.cancel()
+        self.__exit(130)
+
+class SimulatedSSHSessionPool(object):
+    """
+    Lokaler Ersatz für SSHSessionPool; Befehle laufen nur als Timer.
+    """
+    def __init__(self, connect_latency=0.0, process_duration=60):
+        self.connect_latency = connect_latency
+        self.process_duration = process_duration
+        self.active = False
+        self.warmed_up = False
+        self.commands = []
+
+    def warm_up(self):
+        if self.warmed_up:
+            return
+        self.warmed_up = True
+        self.connect()
+
+    def start(self):
+        pass
+
+    def connect(self):
+        time.sleep(self.connect_latency)
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def execute(self, command, on_output=None):
+        if not self.active:
+            raise paramiko.SSHException("SSH connection not available")
+        self.commands.append(command)
+        return SimulatedRemoteProcess(command, self.process_duration)
+
+    def close(self):
+        self.active = False
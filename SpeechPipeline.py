@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import re
+import threading
+import time
+import traceback
+from collections import namedtuple, deque
+
+MARKUP_PATTERN = re.compile(r"\^(\w+)\(([^()^]*)\)")
+KNOWN_COMMANDS = ("start", "wait", "stop", "run", "startTag", "waitTag", "stopTag", "runTag", "call", "pCall", "mode")
+ANIMATION_COMMANDS = ("start", "wait", "stop", "run")
+TAG_COMMANDS = ("startTag", "waitTag", "stopTag", "runTag")
+
+# Zeitmessung je gesprochener Zeile; gap ist die Pause seit dem Ende der vorherigen Zeile
+LineTiming = namedtuple("LineTiming", ["line", "issued", "finished", "gap"])
+
+def parse_markup(line):
+    """
+    Zerlegt die ALAnimatedSpeech-Annotationen einer Zeile in (Befehl, Argument)-Paare.
+    Unbekannte oder unvollständige Annotationen meldet markup_problems.
+    """
+    return MARKUP_PATTERN.findall(line)
+
+def markup_problems(line):
+    """
+    Liefert Beschreibungen unbekannter Befehle, fehlender Argumente und einzelner '^' einer Zeile.
+    """
+    problems = []
+    tags = parse_markup(line)
+    if line.count("^") != len(tags):
+        problems.append("'^' outside of an annotation")
+    for command, argument in tags:
+        if command not in KNOWN_COMMANDS:
+            problems.append("unknown annotation ^{}({})".format(command, argument))
+        elif command in ANIMATION_COMMANDS + TAG_COMMANDS and argument.strip() == "":
+            problems.append("missing argument in ^{}()".format(command))
+    return problems
+
+def validate_markup(texts, installed_animations):
+    """
+    Prüft alle Zeilen aus text.xml auf gültige Annotationen und gegen die auf dem Roboter
+    installierten Animationen. Liefert eine Liste von Problembeschreibungen.
+    """
+    problems = []
+    for section in sorted(texts):
+        for name in sorted(texts[section]):
+            line = texts[section][name]
+            for problem in markup_problems(line):
+                problems.append("{}/{}: {}".format(section, name, problem))
+            started = set()
+            started_tags = set()
+            reported = set()
+            for command, argument in parse_markup(line):
+                if command in TAG_COMMANDS:
+                    if command == "startTag":
+                        started_tags.add(argument)
+                    elif command == "waitTag" and argument not in started_tags:
+                        problems.append("{}/{}: ^waitTag({}) without preceding ^startTag".format(section, name, argument))
+                    continue
+                if command not in ANIMATION_COMMANDS or argument.strip() == "":
+                    continue
+                if argument not in installed_animations and argument not in reported:
+                    reported.add(argument)
+                    problems.append("{}/{}: animation '{}' is not installed".format(section, name, argument))
+                if command == "start":
+                    started.add(argument)
+                elif command == "wait" and argument not in started:
+                    problems.append("{}/{}: ^wait({}) without preceding ^start".format(section, name, argument))
+    return problems
+
+class SpeechPipeline(object):
+    """
+    Spricht Zeilen über ALAnimatedSpeech als Kette von qi-Futures: Die nächste Zeile wird direkt
+    im Callback der vorherigen abgeschickt, ohne Umweg über den aufrufenden Thread.
+    """
+    def __init__(self, animated_speech, history_size=200):
+        self.animated_speech = animated_speech
+        self.timings = deque(maxlen=history_size)
+
+    def say_lines(self, lines):
+        lines = list(lines)
+        if not lines:
+            return []
+
+        done = threading.Event()
+        state = {"error": None, "last_finished": None, "timings": []}
+
+        def issue(index):
+            issued = time.time()
+            gap = issued - state["last_finished"] if state["last_finished"] is not None else 0.0
+            future = self.animated_speech.say(lines[index], _async=True)
+            future.addCallback(lambda finished_future: finished(index, issued, gap, finished_future))
+
+        def finished(index, issued, gap, future):
+            now = time.time()
+            timing = LineTiming(lines[index], issued, now, gap)
+            state["timings"].append(timing)
+            self.timings.append(timing)
+            state["last_finished"] = now
+            if future.hasError():
+                state["error"] = future.error()
+                done.set()
+            elif index + 1 < len(lines):
+                try:
+                    issue(index + 1)
+                except Exception:
+                    state["error"] = traceback.format_exc()
+                    done.set()
+            else:
+                done.set()
+
+        issue(0)
+        done.wait()
+        if state["error"] is not None:
+            raise RuntimeError("ALAnimatedSpeech.say failed: " + str(state["error"]))
+        return state["timings"]
+
+    def get_statistics(self):
+        gaps = [timing.gap for timing in self.timings if timing.gap > 0]
+        durations = [timing.finished - timing.issued for timing in self.timings]
+        return {"lines": len(self.timings),
+                "mean_gap": sum(gaps) / len(gaps) if gaps else 0.0,
+                "max_gap": max(gaps) if gaps else 0.0,
+                "mean_duration": sum(durations) / len(durations) if durations else 0.0}
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+class StartupError(Exception):
+    pass
+
+class StartupOrchestrator(object):
+    """
+    Führt die Startphasen (Service-Proxies, Broker-Verbindung, SSH, Vorladen der Behaviors, ...)
+    parallel aus. Eine Phase startet, sobald alle Phasen, von denen sie abhängt, erfolgreich beendet sind.
+    """
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.done = {}
+        self.failed = set()
+        self.errors = []
+        self.timings = OrderedDict()
+        self.started = None
+
+    def phase(self, name, function, depends_on=()):
+        self.phases[name] = (function, tuple(depends_on))
+        self.done[name] = threading.Event()
+        return self
+
+    def run(self):
+        for name, (function, depends_on) in self.phases.items():
+            for dependency in depends_on:
+                if dependency not in self.phases:
+                    raise StartupError("Phase '{}' depends on unknown phase '{}'".format(name, dependency))
+
+        self.started = time.time()
+        threads = []
+        for name in self.phases:
+            thread = threading.Thread(target=self.__run_phase, args=(name,), name="Startup-" + name)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        self.timings["total"] = (0.0, time.time() - self.started)
+
+        if self.errors:
+            raise StartupError("Startup failed:\n" + "\n".join(self.errors))
+        return self.timings
+
+    def report(self):
+        """
+        Liefert je Phase eine Zeile mit Startzeitpunkt (relativ zum Start) und Dauer.
+        """
+        return ["{:<24} start +{:.3f}s, took {:.3f}s".format(name, offset, duration) for name, (offset, duration) in self.timings.items()]
+
+    def __run_phase(self, name):
+        function, depends_on = self.phases[name]
+        try:
+            for dependency in depends_on:
+                self.done[dependency].wait()
+                if dependency in self.failed:
+                    self.failed.add(name)
+                    return
+            start = time.time()
+            try:
+                function()
+            except Exception:
+                self.failed.add(name)
+                self.errors.append("Phase '{}': {}".format(name, traceback.format_exc()))
+            self.timings[name] = (start - self.started, time.time() - start)
+        finally:
+            self.done[name].set()
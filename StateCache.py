@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+class StateCache(object):
+    """
+    Letzter bekannter Zustand je Item aus dem Subscription-Stream, mit Zeitstempel und Staleness-TTL.
+    """
+    def __init__(self, default_ttl, ttls=None):
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self.entries = {}
+        self.condition = threading.Condition()
+
+    def update(self, item, value):
+        with self.condition:
+            self.entries[item] = (value, time.time())
+            self.condition.notify_all()
+
+    def get_entry(self, item):
+        """
+        Liefert (Wert, Zeitstempel) oder None, unabhängig vom Alter.
+        """
+        return self.entries.get(item)
+
+    def get(self, item, max_age=None):
+        """
+        Liefert den zwischengespeicherten Wert oder None, falls unbekannt oder veraltet.
+        """
+        entry = self.entries.get(item)
+        if entry is None:
+            return None
+        if max_age is None:
+            max_age = self.ttls.get(item, self.default_ttl)
+        if max_age is not None and time.time() - entry[1] > max_age:
+            return None
+        return entry[0]
+
+    def is_current(self, item, value):
+        cached = self.get(item)
+        return cached is not None and cached == str(value)
+
+    def wait_for(self, item, predicate, timeout, since=None):
+        """
+        Blockiert, bis das Item einen Wert meldet, für den predicate zutrifft, höchstens timeout Sekunden.
+        Mit since werden nur Meldungen ab diesem Zeitpunkt berücksichtigt, sonst alle nicht veralteten.
+        Liefert (erfüllt, letzter Wert).
+        """
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                entry = self.entries.get(item)
+                if entry is not None:
+                    if since is not None:
+                        relevant = entry[1] >= since
+                    else:
+                        relevant = self.get(item) is not None
+                    if relevant and predicate(entry[0]):
+                        return True, entry[0]
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False, entry[0] if entry is not None else None
+                self.condition.wait(remaining)
+
+def read_ttls(mqtt_topics_root):
+    """
+    Liest die optionalen ttl-Attribute der Items aus der mqtt_topics.xml.
+    """
+    ttls = {}
+    for element in mqtt_topics_root.iter():
+        ttl = element.get("ttl")
+        if ttl is not None and element.text is not None:
+            ttls[element.text.strip()] = float(ttl)
+    return ttls
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import threading
+
+# Eintrag im Abschnitt <Subscriptions> der mqtt_topics.xml, der unabhängig von den Szenen gilt
+ALWAYS = "ALWAYS"
+
+class SubscriptionPlanner(object):
+    """
+    Bestimmt die minimale Menge an Topics aus den Items, die die aktiven Szenen benötigen, und den
+    Items aus mirrored, die unabhängig von den Szenen nach ALMemory gespiegelt werden.
+    Beim Ein- und Ausschalten einer Szene wird nur die Differenz geliefert.
+    """
+    def __init__(self, topic_base, subscriptions, enabled_scenes, subscribe_all=False, mirrored=()):
+        self.topic_base = topic_base
+        self.subscriptions = subscriptions
+        self.subscribe_all = subscribe_all
+        self.mirrored = frozenset(topic_base + item for item in mirrored)
+        self.enabled_scenes = set(enabled_scenes)
+        self.lock = threading.Lock()
+
+    def topics(self):
+        """
+        Liefert die vollständigen Topics, die derzeit abonniert sein sollen, sortiert.
+        """
+        with self.lock:
+            return sorted(self.__plan(self.enabled_scenes))
+
+    def set_scene_enabled(self, scene, enabled):
+        """
+        Schaltet eine Szene ein oder aus und liefert (neu zu abonnieren, abzubestellen).
+        """
+        with self.lock:
+            before = self.__plan(self.enabled_scenes)
+            if enabled:
+                self.enabled_scenes.add(scene)
+            else:
+                self.enabled_scenes.discard(scene)
+            after = self.__plan(self.enabled_scenes)
+        return sorted(after - before), sorted(before - after)
+
+    def __plan(self, scenes):
+        if self.subscribe_all:
+            return set([self.topic_base + "#"])
+        topics = set(self.mirrored)
+        for scene in (ALWAYS,) + tuple(scenes):
+            for item in self.subscriptions.get(scene, ()):
+                topics.add(self.topic_base + item)
+        return topics
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from BasicBehaviour import BasicBehaviour
+from ConfigReloader import ConfigReloader
+from Configuration import load_configuration, load_robots, CONFIG_DIRECTORY
+from MQTTConenectionManager import MQTTConnectionManager
+from SSHSessionPool import SSHSessionPool
+from StateCache import StateCache
+from Tracing import Tracer
+
+class Supervisor(object):
+    """
+    Steuert mehrere Pepper gleichzeitig aus einem Prozess. Konfiguration, Broker-Verbindung,
+    StateCache, SSH-Pool und Tracer werden geteilt; eingehende Zustände werden an alle Roboter verteilt.
+    Jeder Roboter läuft in einem eigenen Thread mit eigener qi.Session; ein Fehler oder das Ende
+    der Präsentation eines Roboters beendet die anderen nicht.
+    """
+    def __init__(self, configuration, robots):
+        self.configuration = configuration
+        self.robots = robots
+        system = configuration.system
+
+        self.behaviours = []
+        self.lock = threading.Lock()
+        self.results = OrderedDict((robot.name, None) for robot in robots)
+
+        self.tracer = Tracer(system.trace_enabled,
+                             system.trace_capacity,
+                             system.trace_ring_file,
+                             system.trace_ring_capacity,
+                             system.trace_flush_interval)
+        self.state_cache = StateCache(system.state_cache_ttl, configuration.topics.ttls)
+
+        if system.simulation:
+            from Simulation import SimulatedSSHSessionPool
+            self.ssh_pool = SimulatedSSHSessionPool(system.simulation_ssh_latency)
+        else:
+            self.ssh_pool = SSHSessionPool(system.ssh_host,
+                                           system.ssh_port,
+                                           system.ssh_user,
+                                           system.ssh_password,
+                                           system.ssh_keepalive_interval,
+                                           system.ssh_reconnect_delay,
+                                           system.ssh_check_interval,
+                                           system.ssh_connect_timeout)
+        # Ein gemeinsamer Reloader für text.xml und app.xml; jeder Roboter übernimmt Änderungen zwischen seinen Szenen
+        self.reloader = None
+        if system.config_reload:
+            self.reloader = ConfigReloader(configuration, CONFIG_DIRECTORY, system.config_reload_interval)
+
+        # Nur eine Broker-Verbindung und damit nur eine Client-ID für alle Roboter
+        self.mqtt_connection_manager = MQTTConnectionManager(self, configuration, self.state_cache, self.tracer,
+                                                             BasicBehaviour.scene_subscriptions(configuration.topics))
+
+    def on_subscription(self, item, value):
+        with self.lock:
+            behaviours = list(self.behaviours)
+        for behaviour in behaviours:
+            if behaviour.finished:
+                continue
+            try:
+                behaviour.on_subscription(item, value)
+            except Exception:
+                traceback.print_exc()
+
+    def run(self):
+        """
+        Startet alle Roboter und kehrt zurück, wenn alle fertig sind. Liefert je Roboter "finished" oder den Fehler.
+        """
+        threads = []
+        for robot in self.robots:
+            thread = threading.Thread(target=self.__run_robot, args=(robot,), name="Robot-" + robot.name)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        self.stop()
+        return self.results
+
+    def stop(self):
+        if self.reloader is not None:
+            self.reloader.stop()
+        self.mqtt_connection_manager.disconnect()
+        self.ssh_pool.close()
+        if self.tracer.enabled:
+            self.tracer.close()
+            if self.configuration.system.trace_chrome_file is not None:
+                self.tracer.export_chrome(self.configuration.system.trace_chrome_file)
+
+    def __open_session(self, robot):
+        if self.configuration.system.simulation:
+            from Simulation import SimulatedApplication
+            return SimulatedApplication(self.configuration).session
+        import qi
+        session = qi.Session()
+        session.connect("tcp://" + robot.url + ":" + str(robot.port))
+        return session
+
+    def __run_robot(self, robot):
+        session = None
+        behaviour = None
+        try:
+            session = self.__open_session(robot)
+            behaviour = BasicBehaviour(None, session, self.configuration,
+                                       name=robot.name,
+                                       state_cache=self.state_cache,
+                                       mqtt_connection_manager=self.mqtt_connection_manager,
+                                       ssh_pool=self.ssh_pool,
+                                       tracer=self.tracer,
+                                       reloader=self.reloader)
+            with self.lock:
+                self.behaviours.append(behaviour)
+            behaviour.start()
+            self.results[robot.name] = "finished"
+        except Exception:
+            self.results[robot.name] = traceback.format_exc()
+            print("Robot {} failed:".format(robot.name))
+            traceback.print_exc()
+        finally:
+            with self.lock:
+                if behaviour in self.behaviours:
+                    self.behaviours.remove(behaviour)
+            if behaviour is not None and not behaviour.finished:
+                behaviour.disconnect_all()
+            if session is not None and hasattr(session, "close"):
+                session.close()
+
+if __name__ == "__main__":
+    configuration = load_configuration()
+    robots = load_robots(os.path.join(CONFIG_DIRECTORY, "robots.xml"))
+
+    results = Supervisor(configuration, robots).run()
+    for name, result in results.items():
+        print("{}: {}".format(name, result))
+    sys.exit(0 if all(result == "finished" for result in results.values()) else 1)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+import traceback
+
+class TimelineError(Exception):
+    pass
+
+class Timeline(object):
+    """
+    Deklarative Szene aus mehreren Spuren (Sprache, Bewegung, Animation, Geräte), die parallel laufen.
+    Innerhalb einer Spur werden die Schritte nacheinander ausgeführt; über signal() und wait()
+    lassen sich Synchronisationspunkte zwischen den Spuren setzen.
+    """
+    def __init__(self, name, cue_timeout=60):
+        self.name = name
+        self.cue_timeout = cue_timeout
+        self.tracks = []
+        self.cues = {}
+        self.errors = []
+        self.durations = {}
+        self.aborted = False
+
+    def track(self, name, steps):
+        self.tracks.append((name, list(steps)))
+        return self
+
+    def signal(self, cue):
+        """
+        Schritt, der den Synchronisationspunkt cue freigibt.
+        """
+        event = self.__cue(cue)
+        return event.set
+
+    def wait(self, cue, timeout=None):
+        """
+        Schritt, der wartet, bis eine andere Spur den Synchronisationspunkt cue freigegeben hat.
+        """
+        event = self.__cue(cue)
+        if timeout is None:
+            timeout = self.cue_timeout
+
+        def wait_step():
+            if not event.wait(timeout) and not self.aborted:
+                raise TimelineError("Timeout while waiting for cue '{}' in timeline '{}'".format(cue, self.name))
+        return wait_step
+
+    def run(self):
+        """
+        Führt alle Spuren parallel aus und kehrt zurück, wenn alle beendet sind.
+        Die erste Spur läuft im aufrufenden Thread.
+        """
+        threads = []
+        for name, steps in self.tracks[1:]:
+            thread = threading.Thread(target=self.__run_track, args=(name, steps), name="Timeline-" + self.name + "-" + name)
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+
+        if self.tracks:
+            self.__run_track(*self.tracks[0])
+
+        for thread in threads:
+            thread.join()
+
+        if self.errors:
+            raise TimelineError("Timeline '{}' failed:\n{}".format(self.name, "\n".join(self.errors)))
+        return self.durations
+
+    def __cue(self, cue):
+        if cue not in self.cues:
+            self.cues[cue] = threading.Event()
+        return self.cues[cue]
+
+    def __run_track(self, name, steps):
+        start = time.time()
+        try:
+            for step in steps:
+                if self.aborted:
+                    break
+                step()
+        except Exception:
+            self.errors.append("Track '{}': {}".format(name, traceback.format_exc()))
+            # Alle anderen Spuren freigeben, damit keine auf einen nie kommenden Synchronisationspunkt wartet
+            self.aborted = True
+            for event in list(self.cues.values()):
+                event.set()
+        self.durations[name] = time.time() - start
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from collections import namedtuple
+
+# Ergebnis eines Lookups: Item-Name, Handler-Typ und Zuordnung Wert -> ALMemory-Event
+TopicRoute = namedtuple("TopicRoute", ["item", "handler", "events"])
+
+HANDLER_WINDOW = "window"
+HANDLER_MEMORY = "memory"
+
+WINDOW_EVENTS = {"OPEN": "WindowOpend", "CLOSED": "WindowClosed"}
+
+# Abschnitte der mqtt_topics.xml mit Gerätegruppen und Abonnements je Szene; enthalten keine eigenen Topics
+GROUPS_TAG = "Groups"
+SUBSCRIPTIONS_TAG = "Subscriptions"
+SECTION_TAGS = (GROUPS_TAG, SUBSCRIPTIONS_TAG)
+
+class TopicIndex(object):
+    """
+    Kompiliert die mqtt_topics.xml einmalig in einen unveränderlichen Index
+    vom vollständigen Topic auf Handler und Event-Namen.
+    """
+    __slots__ = ("_routes",)
+
+    def __init__(self, mqtt_topics_root, topic_base):
+        routes = {}
+        for room in mqtt_topics_root:
+            if room.tag in SECTION_TAGS:
+                continue
+            for category in room:
+                if category.tag == "windows":
+                    handler, events = HANDLER_WINDOW, WINDOW_EVENTS
+                else:
+                    handler, events = HANDLER_MEMORY, None
+
+                for element in category.iter():
+                    if len(element) > 0 or element.text is None:
+                        continue
+                    item = element.text.strip()
+                    if item == "":
+                        continue
+                    routes[topic_base + item] = TopicRoute(item, handler, events)
+
+        object.__setattr__(self, "_routes", routes)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TopicIndex ist unveränderlich")
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, topic):
+        return topic in self._routes
+
+    def lookup(self, topic):
+        """
+        Liefert die TopicRoute zum vollständigen Topic oder None, falls das Topic nicht konfiguriert ist.
+        """
+        return self._routes.get(topic)
+
+    def topics(self):
+        return list(self._routes.keys())
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+RING_MAGIC = b"PTRB"
+RING_HEADER = struct.Struct("<4sII")
+RING_RECORD = struct.Struct("<ddI16s48s")
+
+class NullSpan(object):
+    """
+    Span für abgeschaltetes Tracing; wird nur einmal angelegt und wiederverwendet.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        return False
+
+NULL_SPAN = NullSpan()
+
+class Span(object):
+    __slots__ = ("tracer", "name", "category", "args", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.tracer.record(self.name, self.category, self.start, time.time() - self.start, self.args)
+        return False
+
+class TracedService(object):
+    """
+    Hüllt einen NAOqi-Service ein und misst die Aufrufe der angegebenen Methoden.
+    """
+    def __init__(self, service, tracer, category, methods):
+        self.service = service
+        self.tracer = tracer
+        self.category = category
+        self.methods = methods
+
+    def __getattr__(self, name):
+        attribute = getattr(self.service, name)
+        if name not in self.methods:
+            return attribute
+
+        def traced(*args, **kwargs):
+            with self.tracer.span(name, self.category):
+                return attribute(*args, **kwargs)
+        return traced
+
+class RingBufferFile(object):
+    """
+    Kompakter Ringpuffer auf der Festplatte mit Records fester Größe.
+    Der Header enthält Kapazität und die Position des nächsten Records.
+    """
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        self.position = 0
+        if os.path.exists(path) and os.path.getsize(path) >= RING_HEADER.size:
+            with open(path, "rb") as ring_file:
+                magic, stored_capacity, position = RING_HEADER.unpack(ring_file.read(RING_HEADER.size))
+            if magic == RING_MAGIC and stored_capacity == capacity:
+                self.position = position
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        self.__write_header()
+
+    def __write_header(self):
+        self.file.seek(0)
+        self.file.write(RING_HEADER.pack(RING_MAGIC, self.capacity, self.position))
+
+    def write(self, records):
+        for name, category, start, duration, thread_id, args in records:
+            self.file.seek(RING_HEADER.size + (self.position % self.capacity) * RING_RECORD.size)
+            self.file.write(RING_RECORD.pack(start, duration, thread_id & 0xffffffff,
+                                             category.encode("utf-8")[:16], name.encode("utf-8")[:48]))
+            self.position += 1
+        self.__write_header()
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def read_ring_buffer(path):
+    """
+    Liest einen Ringpuffer in zeitlicher Reihenfolge als Liste von (Name, Kategorie, Start, Dauer, Thread, Args).
+    """
+    with open(path, "rb") as ring_file:
+        magic, capacity, position = RING_HEADER.unpack(ring_file.read(RING_HEADER.size))
+        if magic != RING_MAGIC:
+            raise ValueError("Not a trace ring buffer: " + path)
+        data = ring_file.read()
+
+    count = min(position, capacity, len(data) // RING_RECORD.size)
+    first = position - count
+    records = []
+    for index in range(first, position):
+        offset = (index % capacity) * RING_RECORD.size
+        start, duration, thread_id, category, name = RING_RECORD.unpack_from(data, offset)
+        records.append((name.rstrip(b"\0").decode("utf-8", "replace"), category.rstrip(b"\0").decode("utf-8", "replace"),
+                        start, duration, thread_id, None))
+    return records
+
+def write_chrome_trace(records, path):
+    """
+    Schreibt Records im Chrome-Trace-Event-Format (chrome://tracing, Perfetto).
+    """
+    events = []
+    for name, category, start, duration, thread_id, args in records:
+        event = {"name": name, "cat": category, "ph": "X", "pid": 1, "tid": thread_id,
+                 "ts": int(start * 1000000), "dur": int(duration * 1000000)}
+        if args:
+            event["args"] = args
+        events.append(event)
+    with open(path, "w") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, trace_file)
+
+class Tracer(object):
+    """
+    Sammelt Spans im Speicher (begrenzt) und schreibt sie optional periodisch in einen Ringpuffer.
+    Ist das Tracing abgeschaltet, liefert span() ein geteiltes No-Op-Objekt.
+    """
+    def __init__(self, enabled=False, capacity=100000, ring_file=None, ring_capacity=100000, flush_interval=1.0):
+        self.enabled = enabled
+        self.records = deque(maxlen=capacity)
+        self.pending = deque(maxlen=capacity)
+        self.ring = None
+        self.flush_interval = flush_interval
+        self.running = False
+        self.thread = None
+
+        if enabled and ring_file is not None:
+            self.ring = RingBufferFile(ring_file, ring_capacity)
+            self.running = True
+            self.thread = threading.Thread(target=self.__flush_loop, name="TraceFlush")
+            self.thread.daemon = True
+            self.thread.start()
+
+    def span(self, name, category, args=None):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, category, args)
+
+    def record(self, name, category, start, duration, args=None):
+        if not self.enabled:
+            return
+        record = (name, category, start, duration, threading.current_thread().ident, args)
+        self.records.append(record)
+        if self.ring is not None:
+            self.pending.append(record)
+
+    def wrap(self, service, category, methods):
+        if not self.enabled:
+            return service
+        return TracedService(service, self, category, methods)
+
+    def export_chrome(self, path):
+        write_chrome_trace(list(self.records), path)
+
+    def flush(self):
+        if self.ring is None:
+            return
+        records = []
+        while self.pending:
+            records.append(self.pending.popleft())
+        if records:
+            self.ring.write(records)
+
+    def close(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+        if self.ring is not None:
+            self.ring.close()
+
+    def __flush_loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+# Geteilter, abgeschalteter Tracer für Komponenten ohne eigenen Tracer
+NULL_TRACER = Tracer(False)
+
+if __name__ == "__main__":
+    # Ringpuffer in eine Chrome-Trace-Datei umwandeln: python Tracing.py trace.ring trace.json
+    if len(sys.argv) != 3:
+        print("Usage: python Tracing.py <ring buffer file> <chrome trace json>")
+        sys.exit(1)
+    write_chrome_trace(read_ring_buffer(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+class TrafficRecorder(object):
+    """
+    Schreibt eingehende MQTT-Nachrichten als JSONL ({"t": Zeitstempel, "topic": ..., "payload": ...})
+    fortlaufend an eine Datei. Der Netzwerk-Thread legt nur das Tupel in eine begrenzte Queue,
+    Dekodieren und Schreiben übernimmt ein eigener Thread; ist die Queue voll, wird verworfen.
+    """
+    def __init__(self, path, queue_size=10000):
+        self.path = path
+        self.queue = queue.Queue(queue_size)
+        self.recorded = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.__write_loop, name="TrafficRecorder")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def record(self, topic, payload, timestamp=None):
+        try:
+            self.queue.put_nowait((time.time() if timestamp is None else timestamp, topic, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def get_statistics(self):
+        return {"recorded": self.recorded,
+                "dropped": self.dropped,
+                "queue_depth": self.queue.qsize()}
+
+    def __write_loop(self):
+        with io.open(self.path, "a", encoding="utf-8") as traffic_file:
+            while True:
+                entry = self.queue.get()
+                if entry is None:
+                    break
+                timestamp, topic, payload = entry
+                if isinstance(payload, bytes):
+                    payload = payload.decode("utf-8", "replace")
+                line = json.dumps({"t": timestamp, "topic": topic, "payload": payload}, ensure_ascii=False)
+                # json.dumps liefert unter Python 2 bei reinem ASCII einen str
+                traffic_file.write(line if not isinstance(line, bytes) else line.decode("utf-8"))
+                traffic_file.write(u"\n")
+                self.recorded += 1
+                if self.queue.empty():
+                    traffic_file.flush()
+
+def read_traffic(path):
+    """
+    Liest eine Aufzeichnung zeilenweise als (Zeitstempel, Topic, Payload), ohne die Datei komplett zu laden.
+    """
+    with io.open(path, "r", encoding="utf-8") as traffic_file:
+        for line in traffic_file:
+            line = line.strip()
+            if line == "":
+                continue
+            entry = json.loads(line)
+            yield entry["t"], entry["topic"], entry["payload"]
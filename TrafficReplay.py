@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import sys
+import threading
+import time
+from array import array
+from Benchmark import percentile, simulated_configuration, without_rate_limit, create_behaviour
+from Configuration import load_configuration
+from Simulation import SimulatedBroker, SimulatedMessage, SimulatedMQTTClient
+from TrafficRecorder import read_traffic
+
+# Obergrenzen der Histogramm-Klassen in Millisekunden; die letzte Klasse ist offen
+HISTOGRAM_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+def latency_histogram(latencies):
+    counts = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+    for latency in latencies:
+        milliseconds = latency * 1000
+        index = 0
+        while index < len(HISTOGRAM_BOUNDS_MS) and milliseconds > HISTOGRAM_BOUNDS_MS[index]:
+            index += 1
+        counts[index] += 1
+    labels = ["<= {}ms".format(bound) for bound in HISTOGRAM_BOUNDS_MS] + ["> {}ms".format(HISTOGRAM_BOUNDS_MS[-1])]
+    return list(zip(labels, counts))
+
+def replay(configuration, path, speed, via_broker=False, drain_timeout=30):
+    """
+    Spielt eine Aufzeichnung mit speed-facher Geschwindigkeit durch MQTTConnectionManager.on_message
+    bis BasicBehaviour.on_subscription und misst Durchsatz und Latenz je Nachricht.
+    Mit via_broker laufen die Nachrichten über den (simulierten) Broker und den Client des Managers.
+    """
+    behaviour = create_behaviour(configuration)
+    manager = behaviour.mqtt_connection_manager
+    lock = threading.Lock()
+    pending = {}
+    latencies = array("d")
+    counts = {"sent": 0, "delivered": 0, "rejected": 0}
+    idle = threading.Condition(lock)
+    on_subscription = behaviour.on_subscription
+    on_message = manager.on_message
+
+    def timed_on_subscription(item, value):
+        on_subscription(item, value)
+        now = time.time()
+        with lock:
+            sent_queue = pending.get((item, value))
+            if sent_queue:
+                latencies.append(now - sent_queue.pop(0))
+            counts["delivered"] += 1
+            idle.notify_all()
+    behaviour.on_subscription = timed_on_subscription
+
+    def observed_on_message(client, userdata, message):
+        # Verworfene oder gedrosselte Nachrichten aus der Zuordnung entfernen
+        rejected = manager.rejected_messages()
+        on_message(client, userdata, message)
+        if manager.rejected_messages() != rejected:
+            with lock:
+                sent_queue = pending.get((message.topic, message.payload.decode()))
+                if sent_queue:
+                    sent_queue.pop(0)
+                counts["rejected"] += 1
+                idle.notify_all()
+
+    publisher = None
+    if via_broker:
+        manager.client.on_message = observed_on_message
+        manager.subscribe_to_items(["#"])
+        publisher = SimulatedMQTTClient("PepperReplay", broker=SimulatedBroker.default(configuration.system))
+        publisher.connect(None)
+        publisher.loop_start()
+
+    first_timestamp = None
+    start = time.time()
+    for timestamp, topic, payload in read_traffic(path):
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        delay = start + (timestamp - first_timestamp) / speed - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+        with lock:
+            pending.setdefault((topic, payload), []).append(time.time())
+            counts["sent"] += 1
+        message = SimulatedMessage(topic, payload.encode("utf-8"))
+        if publisher is not None:
+            publisher.publish(topic, message.payload)
+        else:
+            observed_on_message(None, None, message)
+    sent_done = time.time()
+
+    with lock:
+        deadline = time.time() + drain_timeout
+        while counts["delivered"] + counts["rejected"] < counts["sent"] and time.time() < deadline:
+            idle.wait(deadline - time.time())
+    elapsed = time.time() - start
+
+    if publisher is not None:
+        publisher.disconnect()
+        publisher.loop_stop()
+    statistics = manager.get_statistics()
+    try:
+        behaviour.disconnect_all()
+    except SystemExit:
+        pass
+
+    values = list(latencies)
+    return {"speed": speed,
+            "messages": counts["sent"],
+            "delivered": counts["delivered"],
+            "rejected": counts["rejected"],
+            "throttled": statistics["throttled_messages"],
+            "filtered": statistics["filtered_messages"],
+            "dropped": statistics["dropped_messages"] + statistics["dropped_priority_messages"],
+            "send_seconds": sent_done - start,
+            "seconds": elapsed,
+            "messages_per_second": counts["delivered"] / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+            "max_ms": max(values) * 1000 if values else 0.0,
+            "histogram": latency_histogram(values)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded MQTT traffic against the dispatch path of the simulation backend")
+    parser.add_argument("recording", help="JSONL file written by TrafficRecorder (TRAFFIC_RECORD_FILE)")
+    parser.add_argument("--speed", type=float, nargs="+", default=[1.0, 10.0, 100.0], help="replay speed factors")
+    parser.add_argument("--via-broker", action="store_true", help="publish through the simulated broker instead of calling on_message directly")
+    parser.add_argument("--no-rate-limit", action="store_true", help="disable the per-topic rate limit (MQTT_RATE_LIMIT)")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    configuration = simulated_configuration(load_configuration())
+    if args.no_rate_limit:
+        configuration = without_rate_limit(configuration)
+    results = []
+    for speed in args.speed:
+        result = replay(configuration, args.recording, speed, args.via_broker)
+        results.append(result)
+        print("{:g}x: {} messages, {} delivered, {} throttled, {} filtered, {} dropped, {:.0f} msg/s, p50 {:.3f}ms, p99 {:.3f}ms, max {:.3f}ms".format(
+            speed, result["messages"], result["delivered"], result["throttled"], result["filtered"], result["dropped"],
+            result["messages_per_second"], result["p50_ms"], result["p99_ms"], result["max_ms"]))
+        for label, count in result["histogram"]:
+            if count:
+                print("  {:<12} {}".format(label, count))
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())